@@ -30,20 +30,27 @@ async def upload_all_products(
         
         # Step 1: Fetch data from databases
         logger.info("Fetching data from databases...")
-        products = db_service.fetch_products()
-        images = db_service.fetch_images()
-        warranties = db_service.fetch_warranties()
+        # Products and warranties are independent queries: run them concurrently on pooled connections
+        products, warranties = await asyncio.gather(
+            asyncio.to_thread(db_service.fetch_products),
+            asyncio.to_thread(db_service.fetch_warranties)
+        )
         
         if not products:
             raise HTTPException(status_code=404, detail="No products found in database")
         
-        # Step 2: Merge data
-        logger.info("Merging data...")
-        merged_items = product_service.merge_data(products, images, warranties)
+        def _merge_and_process():
+            # Step 2: Merge data; images carry blobs, so stream them straight into merge_data
+            # instead of holding a second full copy
+            logger.info("Merging data...")
+            merged_items = product_service.merge_data(products, db_service.iter_images(), warranties)
+            
+            # Step 3: Process into Shopify format
+            logger.info("Processing products for Shopify...")
+            return product_service.process_products(merged_items)
         
-        # Step 3: Process into Shopify format
-        logger.info("Processing products for Shopify...")
-        shopify_products = product_service.process_products(merged_items)
+        # The image scan and the transformation are blocking: keep them, and the stream's connection, off the event loop
+        shopify_products = await asyncio.to_thread(_merge_and_process)
         
         execution_time = time.time() - start_time
         
@@ -135,12 +142,23 @@ async def delete_products_by_ids(
 ):
     start_time = time.time()
     try:
-        ids = [pid.replace('prod-', '') for pid in request.product_ids]
+        # Each id once, in request order, so a repeated id never issues a second DELETE
+        ids = list(dict.fromkeys(pid.replace('prod-', '') for pid in request.product_ids))
         results = []
+        # Resolve every handle up front, in a few batched lookups instead of one per id
+        lookup_error = None
+        try:
+            products_by_handle = await shopify_service.get_products_by_handles([f"prod-{pid}" for pid in ids])
+        except Exception as e:
+            products_by_handle = {}
+            lookup_error = str(e)
         for pid in ids:
             handle = f"prod-{pid}"
-            product = await shopify_service.get_product_by_handle(handle)
-            if product and product.get('id'):
+            product = products_by_handle.get(handle)
+            if lookup_error is not None:
+                # The lookup failed, so the product may well exist: report an error, not not_found
+                results.append({"product_id": pid, "handle": handle, "status": "error", "message": f"lookup_failed: {lookup_error}"})
+            elif product and product.get('id'):
                 res = await shopify_service.delete_product_by_id(int(product['id']))
                 results.append({"product_id": pid, "handle": handle, **res})
             else:
@@ -179,8 +197,10 @@ async def create_products_by_ids(
         if missing:
             logger.warning(f"Some products not found in database: {missing}")
 
-        images = db_service.fetch_images()
-        warranties = db_service.fetch_warranties()
+        # Only load images and warranty options that belong to the requested products
+        images = db_service.fetch_images_by_supplier_aids(list(found_ids))
+        groups = {p.get('Garantiegruppe') for p in db_products if p.get('Garantiegruppe') is not None}
+        warranties = db_service.fetch_warranties_by_groups(list(groups)) if groups else []
         merged = product_service.merge_data(db_products, images, warranties)
         wrappers = product_service.process_products(merged)
         results = await shopify_service.send_products_batch(wrappers, request.batch_size or 3)
@@ -212,6 +232,9 @@ async def update_products_by_ids(
 
         results = []
         batch_size = 200
+        # Warranty options per Garantiegruppe, read once per request: batches mostly share the same few groups
+        warranties_by_group: Dict[Any, List[Dict[str, Any]]] = {}
+        loaded_groups = set()
         # Process IDs in batches to avoid overly large SQL IN clauses
         for i in range(0, len(ids), batch_size):
             batch_ids = ids[i:i + batch_size]
@@ -224,7 +247,7 @@ async def update_products_by_ids(
                     results.append({"product_id": pid, "status": "skipped", "message": "not_in_db"})
                 continue
 
-            # Fetch only relevant images and warranties for this batch
+            # Fetch only relevant images for this batch, and warranties for groups not loaded by an earlier batch
             # Collect supplier_aid and garantiegruppe values from batch rows
             supplier_aids = [str(p.get('ProductId')) for p in db_products_batch if p.get('ProductId') is not None]
             groups = []
@@ -236,8 +259,12 @@ async def update_products_by_ids(
                 except Exception:
                     continue
 
-            images = db_service.fetch_images_by_supplier_aids(supplier_aids)
-            warranties = db_service.fetch_warranties_by_groups(list(set(groups))) if groups else []
+            # Index once per batch so each product only sees its own images/warranties
+            images_by_supplier = db_service.fetch_images_by_supplier_aids_indexed(supplier_aids)
+            new_groups = set(groups) - loaded_groups
+            if new_groups:
+                warranties_by_group.update(db_service.fetch_warranties_by_groups_indexed(list(new_groups)))
+                loaded_groups |= new_groups
 
             # Create lookup for fast access within the batch (normalize keys to str)
             db_products_by_id = {str(p.get('ProductId')): p for p in db_products_batch}
@@ -250,19 +277,20 @@ async def update_products_by_ids(
                     results.append({"product_id": pid, "status": "skipped", "message": "not_in_db"})
                     continue
 
-                handle = f"prod-{pid}"
-                merged = product_service.merge_data([db_p], images, warranties)
+                merged = product_service.merge_data(
+                    [db_p],
+                    images_by_supplier.get(db_p.get('ProductId'), []),
+                    warranties_by_group.get(db_p.get('Garantiegruppe'), [])
+                )
                 wrappers = product_service.process_products(merged)
                 if not wrappers:
                     results.append({"product_id": pid, "status": "error", "message": "transform_failed"})
                     continue
 
+                # The handle was already built from the ProductId by _create_shopify_product
+                handle = wrappers[0].product.handle
                 res = await shopify_service.update_product_by_handle(handle, wrappers[0].product.model_dump())
                 results.append({"product_id": pid, "handle": handle, **res})
-
-            # Optional small pause between batches to be gentle on upstream systems
-            if i + batch_size < len(ids):
-                await asyncio.sleep(0.5)
         execution_time = time.time() - start_time
         return WorkflowResponse(
             status="completed",
@@ -320,76 +348,80 @@ async def export_shopify_products(
                 category = product.get('product_type') or ""
                 category_path = category if category else ""
 
+                # Look the nested parts up once; the fields below all read from them
+                raw_variants = product.get('variants')
+                metafields = product.get('metafields', {})
+                images = product.get('images')
+                get_metafield = metafields.get
+
                 variants = []
-                if product.get('variants'):
-                    if isinstance(product['variants'], list):
+                if raw_variants:
+                    if isinstance(raw_variants, list):
                         # Direct array structure (REST API or processed data)
-                        variants = product['variants']
-                    elif isinstance(product['variants'], dict) and 'edges' in product['variants']:
+                        variants = raw_variants
+                    elif isinstance(raw_variants, dict) and 'edges' in raw_variants:
                         # GraphQL edge structure
-                        variants = [edge['node'] for edge in product['variants']['edges']]
+                        variants = [edge['node'] for edge in raw_variants['edges']]
 
-                logger.debug(f"Product {handle}: Found {len(variants)} variants")
+                logger.debug("Product %s: Found %d variants", handle, len(variants))
                 if variants:
-                    logger.debug(f"First variant structure: {variants[0]}")
+                    logger.debug("First variant structure: %s", variants[0])
 
-                # Warranty from variant option1 (if present)
                 warranty = ""
-                if product.get('variants') and len(product['variants']) > 0:
-                    option1 = product['variants'][0].get('option1', '')
-                    if option1:
-                        warranty = option1
-
-                # Prices from first variant
                 price_b2b_regular = 0.0
                 price_b2b_discounted = 0.0
                 price_b2c_incl_vat = 0.0
-                if product.get('variants') and len(product['variants']) > 0:
-                    variant0 = product['variants'][0]
+                stock = 0
+                gross_weight = 0.0
+                net_weight = 0.0
+                if raw_variants and len(raw_variants) > 0:
+                    variant0 = raw_variants[0]
+
+                    # Warranty from variant option1 (if present)
+                    option1 = variant0.get('option1', '')
+                    if option1:
+                        warranty = option1
+
+                    # Prices from first variant
                     try:
                         price = float(variant0.get('price', 0) or 0)
-                        price_b2b_regular = float(product.get('metafields', {}).get('Price_B2B_Regular', 0))
-                        price_b2b_discounted = float(product.get('metafields', {}).get('Price_B2B_Discounted', 0))
+                        price_b2b_regular = float(get_metafield('Price_B2B_Regular', 0))
+                        price_b2b_discounted = float(get_metafield('Price_B2B_Discounted', 0))
                         price_b2c_incl_vat = price  # explicit per requested schema example
                     except (ValueError, TypeError):
                         pass
 
-                # Stock from first variant
-                stock = 0
-                if product.get('variants') and len(product['variants']) > 0:
+                    # Stock
                     try:
-                        stock = int(product.get('metafields', {}).get('Inventarbestand', 0) or 0)
+                        stock = int(get_metafield('Inventarbestand', 0) or 0)
                     except (ValueError, TypeError):
                         stock = 0
 
-                # Weights from first variant
-                gross_weight = 0.0
-                net_weight = 0.0
-                if product.get('variants') and len(product['variants']) > 0:
+                    # Weights from first variant
                     try:
-                        w = float(product['variants'][0].get('weight', 0) or 0)
+                        w = float(variant0.get('weight', 0) or 0)
                         gross_weight = w
                         net_weight = 0.0  # unknown; keep 0 per sample
                     except (ValueError, TypeError):
                         pass
 
-                accesssory_products = product.get('metafields', {}).get('verwandte_produkte', '')
-                stock_next_delivery = product.get('metafields', {}).get('StockNextDelivery', '')
-                warranty_group = product.get('metafields', {}).get('warranty_group', 0)
-                ram = product.get('metafields', {}).get('RAM', '')
-                gpu = product.get('metafields', {}).get('GPU', '')
-                prozessor = product.get('metafields', {}).get('Prozessor', '')
-                prozessorfamilie = product.get('metafields', {}).get('Prozessorfamilie', '')
-                bildschirmdiagonale = product.get('metafields', {}).get('Bildschirmdiagonale', '')
-                speicher = product.get('metafields', {}).get('Speicher', '')
+                accesssory_products = get_metafield('verwandte_produkte', '')
+                stock_next_delivery = get_metafield('StockNextDelivery', '')
+                warranty_group = get_metafield('warranty_group', 0)
+                ram = get_metafield('RAM', '')
+                gpu = get_metafield('GPU', '')
+                prozessor = get_metafield('Prozessor', '')
+                prozessorfamilie = get_metafield('Prozessorfamilie', '')
+                bildschirmdiagonale = get_metafield('Bildschirmdiagonale', '')
+                speicher = get_metafield('Speicher', '')
 
                 # Images
                 image_primary = ""
                 image_additional = ""
-                if product.get('images') and len(product['images']) > 0:
-                    image_primary = product['images'][0].get('src', '') or ""
-                    if len(product['images']) > 1:
-                        image_additional = product['images'][1].get('src', '') or ""
+                if images and len(images) > 0:
+                    image_primary = images[0].get('src', '') or ""
+                    if len(images) > 1:
+                        image_additional = images[1].get('src', '') or ""
 
                 # Construct standardized product
                 standardized_product = {
@@ -9,11 +9,15 @@ class Settings(BaseSettings):
     db_user: str = Field("your_username", env="DB_USER")
     db_password: str = Field("your_password", env="DB_PASSWORD")
     db_driver: str = Field("ODBC Driver 18 for SQL Server", env="DB_DRIVER")
+    db_pool_size: int = Field(10, env="DB_POOL_SIZE")
+    db_pool_recycle: int = Field(1800, env="DB_POOL_RECYCLE")
+    db_pool_pre_ping: bool = Field(True, env="DB_POOL_PRE_PING")
     
     # Shopify
     shopify_shop_url: str = Field("https://your-shop.myshopify.com", env="SHOPIFY_SHOP_URL")
     shopify_access_token: str = Field("your_access_token", env="SHOPIFY_ACCESS_TOKEN")
     shopify_api_version: str = Field("2024-10", env="SHOPIFY_API_VERSION")
+    shopify_max_connections: int = Field(32, env="SHOPIFY_MAX_CONNECTIONS")
     
     # Wortmann FTP / Files
     wortmann_ftp_host: str = Field("", env="WORTMANN_FTP_HOST")
@@ -1,6 +1,8 @@
 import pyodbc
+import queue
+import time
 from contextlib import contextmanager
-from typing import Generator
+from typing import Generator, Tuple
 from app.core.config import settings
 
 
@@ -14,17 +16,64 @@ class DatabaseManager:
             f"PWD={settings.db_password};"
             f"TrustServerCertificate=yes;"
         )
+        # Idle connections as (connection, created_at); LIFO keeps the warmest connection in use
+        self._pool: "queue.LifoQueue[Tuple[pyodbc.Connection, float]]" = queue.LifoQueue(maxsize=settings.db_pool_size)
+    
+    def _acquire(self) -> Tuple[pyodbc.Connection, float]:
+        """Take a healthy idle connection from the pool, or open a new one"""
+        while True:
+            try:
+                connection, created_at = self._pool.get_nowait()
+            except queue.Empty:
+                return pyodbc.connect(self.connection_string), time.monotonic()
+            if time.monotonic() - created_at > settings.db_pool_recycle:
+                self._discard(connection)
+                continue
+            if settings.db_pool_pre_ping:
+                try:
+                    connection.cursor().execute("SELECT 1").fetchone()
+                except pyodbc.Error:
+                    self._discard(connection)
+                    continue
+            return connection, created_at
+    
+    def _release(self, connection: pyodbc.Connection, created_at: float) -> None:
+        """Return a connection to the pool with no open transaction, closing it if the pool is full"""
+        try:
+            connection.rollback()
+            connection.autocommit = False
+            self._pool.put_nowait((connection, created_at))
+        except (pyodbc.Error, queue.Full):
+            self._discard(connection)
+    
+    @staticmethod
+    def _discard(connection: pyodbc.Connection) -> None:
+        try:
+            connection.close()
+        except pyodbc.Error:
+            pass
     
     @contextmanager
     def get_connection(self) -> Generator[pyodbc.Connection, None, None]:
-        """Get database connection with automatic cleanup"""
-        connection = None
+        """Get a pooled database connection; it is handed back to the pool on exit"""
+        connection, created_at = self._acquire()
         try:
-            connection = pyodbc.connect(self.connection_string)
             yield connection
-        finally:
-            if connection:
-                connection.close()
+        except BaseException:
+            # The connection may be broken mid-statement, so don't hand it to the next caller
+            self._discard(connection)
+            raise
+        else:
+            self._release(connection, created_at)
+    
+    def close_all(self) -> None:
+        """Close every idle pooled connection"""
+        while True:
+            try:
+                connection, _ = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(connection)
     
     def test_connection(self) -> bool:
         """Test database connection"""
@@ -2,6 +2,8 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.core.config import settings
+from app.core.database import db_manager
+from app.services.shopify_service import shopify_service
 from app.api.endpoints import products, health, wortmann
 import logging
 import time
@@ -18,9 +20,10 @@ app = FastAPI(
     title=settings.app_name,
     version=settings.version,
     description="FastAPI application for N8N workflow automation with Shopify integration",
-    openapi_url="/api/v1/openapi.json",
-    docs_url="/api/v1/docs",
-    redoc_url="/api/v1/redoc"
+    # Schema generation and the docs UIs are only served in debug mode
+    openapi_url="/api/v1/openapi.json" if settings.debug else None,
+    docs_url="/api/v1/docs" if settings.debug else None,
+    redoc_url="/api/v1/redoc" if settings.debug else None
 )
  
 # Add CORS middleware
@@ -86,7 +89,7 @@ async def root():
         "name": settings.app_name,
         "version": settings.version,
         "status": "running",
-        "docs_url": "/api/v1/docs",
+        "docs_url": app.docs_url,
         "health_check": "/api/v1/health"
     }
  
@@ -103,6 +106,8 @@ async def startup_event():
 async def shutdown_event():
     """Application shutdown event"""
     logger.info(f"Shutting down {settings.app_name}")
+    db_manager.close_all()
+    await shopify_service.aclose()
  
 if __name__ == "__main__":
     import uvicorn
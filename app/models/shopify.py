@@ -1,33 +1,36 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, TypeAdapter
+from typing import List, Literal, Optional
+from typing_extensions import NotRequired, TypedDict
 
 
-class ShopifyVariant(BaseModel):
+# Nested payload parts are only ever dumped to JSON for Shopify's REST API,
+# so they are plain TypedDicts instead of full models
+class ShopifyVariant(TypedDict):
     price: str
     sku: str
     inventory_quantity: int
-    inventory_management: Optional[str] = None
-    inventory_policy: Optional[str] = None
+    inventory_management: NotRequired[Optional[str]]
+    inventory_policy: NotRequired[Optional[str]]
     weight: float
-    weight_unit: str = "kg"
+    weight_unit: NotRequired[Literal['kg', 'g', 'lb', 'oz']]
     option1: str
 
 
-class ShopifyOption(BaseModel):
+class ShopifyOption(TypedDict):
     name: str
     values: List[str]
 
 
-class ShopifyMetafield(BaseModel):
+class ShopifyMetafield(TypedDict):
     namespace: str
     key: str
     value: str
     type: str
 
 
-class ShopifyImage(BaseModel):
+class ShopifyImage(TypedDict):
     attachment: str
-    alt: Optional[str] = None
+    alt: NotRequired[Optional[str]]
 
 class ShopifyProduct(BaseModel):
     title: str
@@ -45,3 +48,6 @@ class ShopifyProduct(BaseModel):
 class ShopifyProductWrapper(BaseModel):
     product: ShopifyProduct
 
+
+# Built once at import; dumps a wrapper straight to the JSON request body in pydantic-core
+SHOPIFY_PRODUCT_BODY_ADAPTER = TypeAdapter(ShopifyProductWrapper)
@@ -1,139 +1,303 @@
-from typing import List, Dict, Any
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain
+from typing import List, Dict, Any, Tuple, Iterator, Optional
 from app.core.database import db_manager
 import logging
 
 logger = logging.getLogger(__name__)
 
+# SQL Server rejects statements with more than 2100 parameters, so IN lists are split at this size
+IN_CLAUSE_CHUNK_SIZE = 1000
+# Concurrent connections used when an IN list spans several chunks (kept below the default pool size)
+IN_QUERY_MAX_WORKERS = 4
+
+# WortmannProdukte columns in insert order; ProductId is the primary key
+WORTMANN_COLUMNS = (
+    'ProductId', 'Title', 'DescriptionShort', 'LongDescription',
+    'Manufacturer', 'Category', 'CategoryPath', 'Warranty',
+    'Price_B2B_Regular', 'Price_B2B_Discounted', 'Price_B2C_inclVAT',
+    'Currency', 'VATRate', 'Stock', 'StockNextDelivery',
+    'ImagePrimary', 'ImageAdditional', 'GrossWeight', 'NetWeight',
+    'NonReturnable', 'EOL', 'Promotion', 'Garantiegruppe', 'AccessoryProducts',
+    'Bildschirmdiagonale', 'Prozessor', 'GPU', 'RAM', 'Speicher', 'Prozessorfamilie',
+)
+_WORTMANN_COLUMN_LIST = ', '.join(WORTMANN_COLUMNS)
+
+# Explicit projections: only the columns the sync actually reads (BilderShopify.filename stays on the server;
+# hex is kept for rows without a base64 blob, which _image_to_base64 falls back to)
+_SELECT_PRODUCTS_SQL = f"SELECT {_WORTMANN_COLUMN_LIST} FROM WortmannProdukte"
+_SELECT_TOP_PRODUCTS_SQL = f"SELECT TOP (?) {_WORTMANN_COLUMN_LIST} FROM WortmannProdukte"
+_SELECT_IMAGES_SQL = "SELECT supplier_aid, base64, hex, IsPrimary FROM BilderShopify"
+_SELECT_TOP_IMAGES_SQL = "SELECT TOP (?) supplier_aid, base64, hex, IsPrimary FROM BilderShopify"
+_SELECT_WARRANTIES_SQL = "SELECT id, name, monate, prozentsatz, minimum, garantiegruppe FROM GarantieOptionen"
+_CREATE_WORTMANN_STAGING_SQL = (
+    "IF OBJECT_ID('tempdb..#WortmannStaging') IS NOT NULL DROP TABLE #WortmannStaging",
+    # Only the loaded columns: extra NOT NULL columns on the real table must not reject staging rows
+    f"SELECT TOP 0 {_WORTMANN_COLUMN_LIST} INTO #WortmannStaging FROM WortmannProdukte",
+)
+_INSERT_WORTMANN_STAGING_SQL = (
+    f"INSERT INTO #WortmannStaging ({_WORTMANN_COLUMN_LIST}) VALUES ({','.join(['?'] * len(WORTMANN_COLUMNS))})"
+)
+# An empty staging table never reaches the MERGE, whose NOT MATCHED BY SOURCE branch would empty WortmannProdukte
+_MERGE_WORTMANN_STAGING_SQL = f"""
+    IF EXISTS (SELECT 1 FROM #WortmannStaging)
+    MERGE WortmannProdukte AS t
+    USING #WortmannStaging AS s ON t.ProductId = s.ProductId
+    WHEN MATCHED THEN UPDATE SET {', '.join(f't.{c} = s.{c}' for c in WORTMANN_COLUMNS[1:])}
+    WHEN NOT MATCHED BY TARGET THEN INSERT ({_WORTMANN_COLUMN_LIST})
+        VALUES ({', '.join(f's.{c}' for c in WORTMANN_COLUMNS)})
+    WHEN NOT MATCHED BY SOURCE THEN DELETE;
+"""
+_INSERT_IMAGE_SQL = "INSERT INTO BilderShopify (supplier_aid, filename, base64, IsPrimary) VALUES (?,?,?,?)"
+
+# Rows per executemany batch when loading image blobs into BilderShopify (blobs are large, keep arrays bounded)
+IMAGE_INSERT_CHUNK_SIZE = 500
+# Rows per fetchmany when streaming image blobs out of BilderShopify
+IMAGE_FETCH_BATCH_SIZE = 100
+
+
+@lru_cache(maxsize=64)
+def _placeholders(count: int) -> str:
+    """Return the "?,?,..." parameter list for an IN clause with count values"""
+    return ','.join(['?'] * count)
+
+
+# Result column names per base SELECT statement; the table schemas are static for the process lifetime
+_COLUMN_CACHE: Dict[str, Tuple[str, ...]] = {}
+
+
+def _column_names(cursor, key: str = None) -> Tuple[str, ...]:
+    """Column names of the current result set, cached under key when one is given"""
+    columns = _COLUMN_CACHE.get(key) if key is not None else None
+    if columns is None:
+        columns = tuple(column[0] for column in cursor.description)
+        if key is not None:
+            _COLUMN_CACHE[key] = columns
+    return columns
+
+
+def _rows_to_dicts(cursor, key: str = None) -> List[Dict[str, Any]]:
+    """Materialize the current result set as one dict per row (column name -> value)"""
+    columns = _column_names(cursor, key)
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _fetch_where_in(cursor, select_sql: str, column: str, values) -> List[Dict[str, Any]]:
+    """Run select_sql filtered by column IN values, one IN_CLAUSE_CHUNK_SIZE chunk per statement"""
+    values = list(values)
+    rows: List[Dict[str, Any]] = []
+    for start in range(0, len(values), IN_CLAUSE_CHUNK_SIZE):
+        chunk = values[start:start + IN_CLAUSE_CHUNK_SIZE]
+        cursor.execute(f"{select_sql} WHERE {column} IN ({_placeholders(len(chunk))})", chunk)
+        rows.extend(_rows_to_dicts(cursor, select_sql))
+    return rows
+
+
+def _iter_row_dicts(cursor, batch: int, key: str = None) -> Iterator[Dict[str, Any]]:
+    """Yield the current result set as dicts, pulling batch rows at a time from the server"""
+    columns = _column_names(cursor, key)
+    cursor.arraysize = batch
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            break
+        yield from (dict(zip(columns, row)) for row in rows)
+
+
+def _iter_where_in(cursor, select_sql: str, column: str, values, batch: int) -> Iterator[Dict[str, Any]]:
+    """Streaming counterpart of _fetch_where_in: yield rows chunk by chunk, batch rows per fetch"""
+    values = list(values)
+    for start in range(0, len(values), IN_CLAUSE_CHUNK_SIZE):
+        chunk = values[start:start + IN_CLAUSE_CHUNK_SIZE]
+        cursor.execute(f"{select_sql} WHERE {column} IN ({_placeholders(len(chunk))})", chunk)
+        yield from _iter_row_dicts(cursor, batch, select_sql)
+
+
+def _bulk_load(conn, before_sql: Tuple[str, ...], insert_sql: str, rows: List[Tuple],
+               batch_size: int, commit_size: Optional[int] = None, after_sql: Tuple[str, ...] = ()) -> int:
+    """Run before_sql, insert rows with fast_executemany in batch_size chunks, then run after_sql, in one transaction.
+
+    commit_size commits every N inserted rows instead of once at the end. That is no longer atomic: an error only
+    rolls back the rows since the last commit, so before_sql and the rows committed so far stay applied.
+    """
+    conn.autocommit = False
+    cursor = conn.cursor()
+    cursor.fast_executemany = True
+    try:
+        for sql in before_sql:
+            cursor.execute(sql)
+        affected = 0
+        uncommitted = 0
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            cursor.executemany(insert_sql, chunk)
+            affected += len(chunk)
+            uncommitted += len(chunk)
+            if commit_size and uncommitted >= commit_size:
+                conn.commit()
+                uncommitted = 0
+        for sql in after_sql:
+            cursor.execute(sql)
+        conn.commit()
+        return affected
+    except Exception:
+        conn.rollback()
+        raise
+
 
 class DatabaseService:
-    def __init__(self):
+    def __init__(self, connection=None):
         self.db_manager = db_manager
+        # Set only on services handed out by session(): every call then reuses this one connection
+        self._session_conn = connection
     
-    def fetch_products(self, limit: int = None) -> List[Dict[str, Any]]:
-        """Fetch products from WortmannProdukte table"""
-        try:
+    @contextmanager
+    def _connection(self):
+        """The session connection if bound, otherwise a pooled connection for this call"""
+        if self._session_conn is not None:
+            yield self._session_conn
+        else:
             with self.db_manager.get_connection() as conn:
+                yield conn
+
+    @contextmanager
+    def session(self) -> Iterator["DatabaseService"]:
+        """Acquire one connection for a group of calls: `with database_service.session() as db: ...`.
+
+        Calls on the yielded service run sequentially on that connection, so exhaust any iter_* stream
+        before issuing the next query.
+        """
+        with self.db_manager.get_connection() as conn:
+            yield DatabaseService(connection=conn)
+
+    def _select(self, select_sql: str, column: str = None, values=None) -> List[Dict[str, Any]]:
+        """Run select_sql on a pooled connection, optionally filtered by column IN values.
+
+        IN lists longer than one chunk are queried concurrently, one pooled connection per chunk, in input order.
+        """
+        if column is not None:
+            values = list(values)
+            # A session connection cannot be shared across threads, so sessions query chunks sequentially
+            if len(values) > IN_CLAUSE_CHUNK_SIZE and self._session_conn is None:
+                chunks = [values[i:i + IN_CLAUSE_CHUNK_SIZE] for i in range(0, len(values), IN_CLAUSE_CHUNK_SIZE)]
+                with ThreadPoolExecutor(max_workers=min(len(chunks), IN_QUERY_MAX_WORKERS)) as executor:
+                    results = executor.map(lambda chunk: self._select(select_sql, column, chunk), chunks)
+                    return list(chain.from_iterable(results))
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            if column is None:
+                cursor.execute(select_sql)
+                return _rows_to_dicts(cursor, select_sql)
+            return _fetch_where_in(cursor, select_sql, column, values)
+    
+    def iter_products(self, limit: int = None, batch: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Stream products from WortmannProdukte without materializing the full result set.
+
+        The connection stays open until the iterator is exhausted or closed, so consume it promptly.
+        """
+        try:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 if limit is not None:
-                    cursor.execute(f"SELECT TOP({limit}) * FROM WortmannProdukte")
+                    cursor.execute(_SELECT_TOP_PRODUCTS_SQL, (limit,))
                 else:
-                    cursor.execute("SELECT * FROM WortmannProdukte")
-                
-                columns = [column[0] for column in cursor.description]
-                products = []
-                
-                for row in cursor.fetchall():
-                    product_dict = {}
-                    for i, value in enumerate(row):
-                        product_dict[columns[i]] = value
-                    products.append(product_dict)
-                
-                logger.info(f"Fetched {len(products)} products from database")
-                return products
+                    cursor.execute(_SELECT_PRODUCTS_SQL)
+                yield from _iter_row_dicts(cursor, batch, _SELECT_PRODUCTS_SQL)
         except Exception as e:
             logger.error(f"Error fetching products: {str(e)}")
             raise
+
+    def fetch_products(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Fetch products from WortmannProdukte table"""
+        products = list(self.iter_products(limit))
+        logger.info(f"Fetched {len(products)} products from database")
+        return products
     
     
     def fetch_products_by_ids(self, product_ids: List[str]) -> List[Dict[str, Any]]:
-        """Fetch multiple products by ProductId list in a single query from WortmannProdukte"""
+        """Fetch multiple products by ProductId list from WortmannProdukte (one query per 1000 ids)"""
         if not product_ids:
             return []
         
         try:
-            with self.db_manager.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Create placeholders for IN clause
-                placeholders = ','.join(['?' for _ in product_ids])
-                query = f"SELECT * FROM WortmannProdukte WHERE ProductId IN ({placeholders})"
-                
-                cursor.execute(query, product_ids)
-                
-                columns = [column[0] for column in cursor.description]
-                products = []
-                
-                for row in cursor.fetchall():
-                    product_dict = {}
-                    for i, value in enumerate(row):
-                        product_dict[columns[i]] = value
-                    products.append(product_dict)
-                
-                logger.info(f"Fetched {len(products)} products from database by IDs (requested: {len(product_ids)})")
-                return products
-                
+            products = self._select(_SELECT_PRODUCTS_SQL, "ProductId", product_ids)
+            logger.info(f"Fetched {len(products)} products from database by IDs (requested: {len(product_ids)})")
+            return products
         except Exception as e:
             logger.error(f"Error fetching products by IDs: {str(e)}")
             raise
     
     
-    def fetch_images(self, limit: int = None) -> List[Dict[str, Any]]:
-        """Fetch images from BilderShopify table"""
+    def iter_images(self, limit: int = None, batch: int = IMAGE_FETCH_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """Stream images from BilderShopify without materializing the full result set.
+
+        Only batch blobs are buffered at a time; batch=1 fetches strictly row by row.
+        The connection stays open until the iterator is exhausted or closed, so consume it promptly.
+        """
         try:
-            with self.db_manager.get_connection() as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 if limit is not None:
-                    cursor.execute(f"SELECT TOP({limit}) * FROM BilderShopify")
+                    cursor.execute(_SELECT_TOP_IMAGES_SQL, (limit,))
                 else:
-                    cursor.execute("SELECT * FROM BilderShopify")
-                
-                columns = [column[0] for column in cursor.description]
-                images = []
-                
-                for row in cursor.fetchall():
-                    image_dict = {}
-                    for i, value in enumerate(row):
-                        image_dict[columns[i]] = value
-                    images.append(image_dict)
-                
-                logger.info(f"Fetched {len(images)} images from database")
-                return images
+                    cursor.execute(_SELECT_IMAGES_SQL)
+                yield from _iter_row_dicts(cursor, batch, _SELECT_IMAGES_SQL)
         except Exception as e:
             logger.error(f"Error fetching images: {str(e)}")
             raise
+
+    def fetch_images(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Fetch images from BilderShopify table"""
+        images = list(self.iter_images(limit))
+        logger.info(f"Fetched {len(images)} images from database")
+        return images
     
     def fetch_images_by_supplier_aids(self, supplier_aids: List[str]) -> List[Dict[str, Any]]:
         """Fetch images for specified supplier_aid (ProductId) values only."""
         if not supplier_aids:
             return []
         try:
-            with self.db_manager.get_connection() as conn:
+            images = self._select(_SELECT_IMAGES_SQL, "supplier_aid", supplier_aids)
+            logger.info(f"Fetched {len(images)} images by supplier_aids (requested: {len(supplier_aids)})")
+            return images
+        except Exception as e:
+            logger.error(f"Error fetching images by supplier_aids: {str(e)}")
+            raise
+
+
+    def iter_images_by_supplier_aids(self, supplier_aids: List[str], batch: int = IMAGE_FETCH_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """Stream images for the given supplier_aid values so only batch blobs are held at a time.
+
+        The connection stays open until the iterator is exhausted or closed, so consume it promptly.
+        """
+        if not supplier_aids:
+            return
+        try:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                placeholders = ','.join(['?' for _ in supplier_aids])
-                query = f"SELECT * FROM BilderShopify WHERE supplier_aid IN ({placeholders})"
-                cursor.execute(query, supplier_aids)
-                columns = [column[0] for column in cursor.description]
-                images = []
-                for row in cursor.fetchall():
-                    image_dict = {}
-                    for i, value in enumerate(row):
-                        image_dict[columns[i]] = value
-                    images.append(image_dict)
-                logger.info(f"Fetched {len(images)} images by supplier_aids (requested: {len(supplier_aids)})")
-                return images
+                yield from _iter_where_in(cursor, _SELECT_IMAGES_SQL, "supplier_aid", supplier_aids, batch)
         except Exception as e:
             logger.error(f"Error fetching images by supplier_aids: {str(e)}")
             raise
 
 
+    def fetch_images_by_supplier_aids_indexed(self, supplier_aids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch images for the given supplier_aid values, grouped by supplier_aid."""
+        images_by_supplier = defaultdict(list)
+        for image in self.fetch_images_by_supplier_aids(supplier_aids):
+            images_by_supplier[image.get('supplier_aid')].append(image)
+        return dict(images_by_supplier)
+
+
     def fetch_warranties(self) -> List[Dict[str, Any]]:
         """Fetch warranties from GarantieOptionen table"""
         try:
-            with self.db_manager.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM GarantieOptionen")
-                
-                columns = [column[0] for column in cursor.description]
-                warranties = []
-                
-                for row in cursor.fetchall():
-                    warranty_dict = {}
-                    for i, value in enumerate(row):
-                        warranty_dict[columns[i]] = value
-                    warranties.append(warranty_dict)
-                
-                logger.info(f"Fetched {len(warranties)} warranties from database")
-                return warranties
+            warranties = self._select(_SELECT_WARRANTIES_SQL)
+            logger.info(f"Fetched {len(warranties)} warranties from database")
+            return warranties
         except Exception as e:
             logger.error(f"Error fetching warranties: {str(e)}")
             raise
@@ -143,62 +307,56 @@ class DatabaseService:
         if not groups:
             return []
         try:
-            with self.db_manager.get_connection() as conn:
-                cursor = conn.cursor()
-                placeholders = ','.join(['?' for _ in groups])
-                query = f"SELECT * FROM GarantieOptionen WHERE garantiegruppe IN ({placeholders})"
-                cursor.execute(query, groups)
-                columns = [column[0] for column in cursor.description]
-                warranties = []
-                for row in cursor.fetchall():
-                    warranty_dict = {}
-                    for i, value in enumerate(row):
-                        warranty_dict[columns[i]] = value
-                    warranties.append(warranty_dict)
-                logger.info(f"Fetched {len(warranties)} warranties by groups (requested groups: {len(groups)})")
-                return warranties
+            warranties = self._select(_SELECT_WARRANTIES_SQL, "garantiegruppe", list(dict.fromkeys(groups)))
+            logger.info(f"Fetched {len(warranties)} warranties by groups (requested groups: {len(groups)})")
+            return warranties
         except Exception as e:
             logger.error(f"Error fetching warranties by groups: {str(e)}")
             raise
-    
 
-    def upsert_wortmann_products(self, products: List[Dict[str, Any]]) -> int:
-        """Upsert Wortmann product rows into WortmannProdukte table."""
+    def fetch_warranties_by_groups_indexed(self, groups: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Fetch warranties for the given garantiegruppe values, grouped by garantiegruppe."""
+        warranties_by_group = defaultdict(list)
+        for warranty in self.fetch_warranties_by_groups(groups):
+            warranties_by_group[warranty.get('garantiegruppe')].append(warranty)
+        return dict(warranties_by_group)
+
+    def upsert_wortmann_products(self, products: List[Dict[str, Any]], batch_size: int = 1000,
+                                 commit_size: Optional[int] = None) -> int:
+        """Upsert Wortmann product rows into WortmannProdukte table.
+
+        Rows are sent batch_size at a time; commit_size commits every N rows (default: one commit for the snapshot).
+        Partial commits only cover the #WortmannStaging load: the MERGE runs after the last row, so a failed load
+        leaves WortmannProdukte untouched.
+        """
         if not products:
             return 0
         try:
-            with self.db_manager.get_connection() as conn:
-                cursor = conn.cursor()
-                affected = 0
-                # Clear table once, then insert fresh snapshot (rental products already enriched)
-                cursor.execute("DELETE FROM WortmannProdukte")
-                for p in products:
-                    cursor.execute(
-                        """
-                        INSERT INTO WortmannProdukte (
-                            ProductId, Title, DescriptionShort, LongDescription,
-                            Manufacturer, Category, CategoryPath, Warranty,
-                            Price_B2B_Regular, Price_B2B_Discounted, Price_B2C_inclVAT,
-                            Currency, VATRate, Stock, StockNextDelivery,
-                            ImagePrimary, ImageAdditional, GrossWeight, NetWeight,
-                            NonReturnable, EOL, Promotion, Garantiegruppe, AccessoryProducts,
-                            Bildschirmdiagonale, Prozessor, GPU, RAM, Speicher, Prozessorfamilie
-                            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                        """,
-                        (
-                            p.get('ProductId'), p.get('Title'), p.get('DescriptionShort'), p.get('LongDescription'),
-                            p.get('Manufacturer'), p.get('Category'), p.get('CategoryPath'), p.get('Warranty'),
-                            p.get('Price_B2B_Regular'), p.get('Price_B2B_Discounted'), p.get('Price_B2C_inclVAT'),
-                            p.get('Currency'), p.get('VATRate'), p.get('Stock'), p.get('StockNextDelivery'),
-                            p.get('ImagePrimary'), p.get('ImageAdditional'), p.get('GrossWeight'), p.get('NetWeight'),
-                            1 if p.get('NonReturnable') else 0, 1 if p.get('EOL') else 0, 1 if p.get('Promotion') else 0,
-                            p.get('Garantiegruppe'), p.get('AccessoryProducts'), p.get('Bildschirmdiagonale'),
-                            p.get('Prozessor'), p.get('GPU'), p.get('RAM'), p.get('Speicher'), p.get('Prozessorfamilie')
-                        )
+            with self._connection() as conn:
+                rows = [
+                    (
+                        p.get('ProductId'), p.get('Title'), p.get('DescriptionShort'), p.get('LongDescription'),
+                        p.get('Manufacturer'), p.get('Category'), p.get('CategoryPath'), p.get('Warranty'),
+                        p.get('Price_B2B_Regular'), p.get('Price_B2B_Discounted'), p.get('Price_B2C_inclVAT'),
+                        p.get('Currency'), p.get('VATRate'), p.get('Stock'), p.get('StockNextDelivery'),
+                        p.get('ImagePrimary'), p.get('ImageAdditional'), p.get('GrossWeight'), p.get('NetWeight'),
+                        1 if p.get('NonReturnable') else 0, 1 if p.get('EOL') else 0, 1 if p.get('Promotion') else 0,
+                        p.get('Garantiegruppe'), p.get('AccessoryProducts'), p.get('Bildschirmdiagonale'),
+                        p.get('Prozessor'), p.get('GPU'), p.get('RAM'), p.get('Speicher'), p.get('Prozessorfamilie')
                     )
-                    affected += 1
-                
-                conn.commit()
+                    for p in products
+                ]
+                # Stage the fresh snapshot (rental products already enriched), then MERGE it in one pass;
+                # rows missing from the snapshot are deleted so the table still mirrors the feed exactly
+                affected = _bulk_load(
+                    conn,
+                    _CREATE_WORTMANN_STAGING_SQL,
+                    _INSERT_WORTMANN_STAGING_SQL,
+                    rows,
+                    batch_size,
+                    commit_size,
+                    (_MERGE_WORTMANN_STAGING_SQL, "DROP TABLE #WortmannStaging")
+                )
                 logger.info(f"Upserted {affected} Wortmann products")
                 return affected
         except Exception as e:
@@ -206,28 +364,27 @@ class DatabaseService:
             raise
     
 
-    def insert_images_records(self, records: List[Dict[str, Any]]) -> int:
-        """Insert image binaries into BilderShopify. Records require supplier_aid, filename, data (bytes), IsPrimary (0/1)."""
+    def insert_images_records(self, records: List[Dict[str, Any]], batch_size: int = IMAGE_INSERT_CHUNK_SIZE,
+                              commit_size: Optional[int] = None) -> int:
+        """Insert image binaries into BilderShopify. Records require supplier_aid, filename, data (bytes), IsPrimary (0/1).
+
+        Rows are sent batch_size at a time; commit_size commits every N rows (default: one commit for the snapshot).
+        Partial commits are not atomic: the DELETE is committed with the first N rows, so a later failure leaves
+        BilderShopify truncated and half-loaded. Leave commit_size unset unless that is acceptable.
+        """
         if not records:
             return 0
         try:
-            with self.db_manager.get_connection() as conn:
-                cursor = conn.cursor()
-                affected = 0
+            with self._connection() as conn:
                 # Clear table once, then insert fresh snapshot
-                cursor.execute("DELETE FROM BilderShopify")
-                for r in records:
-                    cursor.execute(
-                        """
-                        INSERT INTO BilderShopify (supplier_aid, filename, base64, IsPrimary)
-                        VALUES (?,?,?,?)
-                        """,
-                        (
-                            r.get('supplier_aid'), r.get('filename'), r.get('data'), r.get('IsPrimary', 0)
-                        )
-                    )
-                    affected += 1
-                conn.commit()
+                affected = _bulk_load(
+                    conn,
+                    ("DELETE FROM BilderShopify",),
+                    _INSERT_IMAGE_SQL,
+                    [(r.get('supplier_aid'), r.get('filename'), r.get('data'), r.get('IsPrimary', 0)) for r in records],
+                    batch_size,
+                    commit_size
+                )
                 logger.info(f"Inserted {affected} image records into BilderShopify")
                 return affected
         except Exception as e:
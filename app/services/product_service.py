@@ -1,8 +1,10 @@
+from base64 import b64encode
 from collections import defaultdict
 from decimal import Decimal
+from functools import lru_cache
 import json
 import logging
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
 
 from app.models.shopify import (
     ShopifyImage,
@@ -16,36 +18,105 @@ from app.utils.helpers import to_base64
 
 logger = logging.getLogger(__name__)
 
+_HUNDRED = Decimal('100')
+
+# Filter metafields parsed from LongDescription, in the order they are sent to Shopify
+_FILTER_METAFIELD_KEYS = ('Bildschirmdiagonale', 'Prozessor', 'GPU', 'RAM', 'Speicher', 'Prozessorfamilie')
+
+
+@lru_cache(maxsize=4096)
+def _encode_accessories(accessory_products: str) -> str:
+    """JSON list of prefixed handles for a '|'-separated AccessoryProducts value ('' when none are valid).
+
+    Many products share the same accessory list, so the split/prefix/dumps work is cached per raw string.
+    """
+    prefixed_ids = [
+        f"prod-{id.strip()}" 
+        for id in accessory_products.split('|') 
+        if id.strip()
+    ]
+    return json.dumps(prefixed_ids) if prefixed_ids else ''
+
+
+@lru_cache(maxsize=4096)
+def _split_category_path(category_path: str) -> Tuple[str, ...]:
+    """Tags for a CategoryPath; a tuple so the cached value can't be mutated by callers"""
+    return tuple(category_path.split('|'))
+
+
+@lru_cache(maxsize=1024)
+def _warranty_rate(prozentsatz) -> Decimal:
+    """Warranty percentage as an exact Decimal fraction; the few distinct rates are shared by many products"""
+    return Decimal(str(prozentsatz)) / _HUNDRED
+
+
+def _custom_metafield(key: str, value: str, type_: str) -> ShopifyMetafield:
+    """Metafield in the 'custom' namespace, built as a plain dict literal"""
+    return {'namespace': 'custom', 'key': key, 'value': value, 'type': type_}
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except Exception:
+        return 0
+
+
+def _image_to_base64(image: Dict) -> str:
+    """Base64 payload of an image row ('' when it carries none)"""
+    get = image.get
+    img_raw = get('base64') or get('hex')
+    if not img_raw:
+        nested = get('images')
+        if isinstance(nested, list) and nested:
+            img_raw = nested[0].get('base64')
+    if not img_raw:
+        return ''
+    # VARBINARY rows arrive as bytes: encode directly, skipping the generic format sniffing
+    if type(img_raw) is bytes:
+        return b64encode(img_raw).decode('ascii')
+    return to_base64(img_raw)
+
 
 class ProductService:
-    def merge_data(self, products: List[Dict], images: List[Dict], warranties: List[Dict]) -> List[Dict]:
-        """Merge products with images and warranties"""
+    def merge_data(self, products: List[Dict], images: Iterable[Dict], warranties: List[Dict]) -> Iterator[Tuple[Dict, Sequence[str], Sequence[Dict]]]:
+        """Merge products with their base64 images and warranties.
+
+        images may be a stream and is consumed here, up front; the merged tuples are yielded lazily.
+        """
         try:
-            # Create lookup dictionaries
-            images_by_product = defaultdict(list)
-            for image in images:
+            # Encode and de-duplicate images as they stream in: pid -> {base64: (-IsPrimary, arrival)}.
+            # Keeping the best rank per image reproduces "primary first, then arrival order, first copy wins".
+            ranked_images = defaultdict(dict)
+            for seq, image in enumerate(images):
                 supplier_aid = image.get('supplier_aid')
-                if supplier_aid:
-                    images_by_product[supplier_aid].append(image)
-
-            # Sort images per product so that primary images come first
-            def _to_int(value):
+                if not supplier_aid:
+                    continue
                 try:
-                    return int(value)
-                except Exception:
-                    return 0
+                    img_val = _image_to_base64(image)
+                except Exception as e:
+                    logger.warning(f"Error processing image for product {supplier_aid}: {str(e)}")
+                    continue
+                if not img_val:
+                    continue
+                rank = (-_to_int(image.get('IsPrimary')), seq)
+                ranks = ranked_images[supplier_aid]
+                if img_val not in ranks or rank < ranks[img_val]:
+                    ranks[img_val] = rank
 
-            for _supplier_aid, _image_list in images_by_product.items():
-                # Place records with IsPrimary == 1 before others; keep original order among equals (Python sort is stable)
-                _image_list.sort(key=lambda img: _to_int(img.get('IsPrimary')), reverse=True)
+            images_by_product = {
+                pid: sorted(ranks, key=ranks.__getitem__) if len(ranks) > 1 else list(ranks)
+                for pid, ranks in ranked_images.items()
+            }
             
-            # Build warranties_by_group with de-duplication by warranty 'id' and basic validity filter
-            warranties_by_group = defaultdict(list)
+            # Build warranties_by_group with de-duplication by warranty 'id' and basic validity filter.
+            # Groups are keyed as str, the form variants are matched on, so products need no per-warranty filtering.
             temp_warranties_map = defaultdict(dict)  # group -> {id -> warranty}
             for warranty in warranties:
                 group = warranty.get('garantiegruppe')
                 if group is None:
                     continue
+                group = str(group)
                 # Keep only meaningful warranty rows (align with later processing expectations)
                 if warranty.get('name') is None and warranty.get('prozentsatz') is None:
                     continue
@@ -58,109 +129,56 @@ class ProductService:
                     continue
                 temp_warranties_map[group][unique_key] = warranty
 
+            warranties_by_group = {}
             for group, by_id in temp_warranties_map.items():
-                warranties_by_group[group] = list(by_id.values())
-            
-            # Merge data
-            merged_items = []
-            total_products = len(products)
-            for product in products:
-                product_id = product.get('ProductId')
-                guarantee_group = product.get('Garantiegruppe')
-                
-                base_item = product.copy()
-                
-                # Add images
-                images_count = 0
-                if product_id in images_by_product:
-                    for image in images_by_product[product_id]:
-                        merged_item = {**base_item, **image}
-                        merged_items.append(merged_item)
-                        images_count += 1
-                
-                # Add warranties
-                warranties_count = 0
-                if guarantee_group is not None and guarantee_group in warranties_by_group:
-                    for warranty in warranties_by_group[guarantee_group]:
-                        merged_item = {**base_item, **warranty}
-                        merged_items.append(merged_item)
-                        warranties_count += 1
-                
-                # If no images or warranties, add base item
-                if (product_id not in images_by_product and 
-                    (guarantee_group is None or guarantee_group not in warranties_by_group)):
-                    merged_items.append(base_item)
-                
-                try:
-                    logger.debug(
-                        f"merge_data: ProductId={product_id} images={images_count} warranties={warranties_count} total_for_product={images_count + warranties_count if (images_count or warranties_count) else 1}"
-                    )
-                except Exception:
-                    pass
+                # Only named warranties with a percentage become variants, each id once
+                seen_warranty_ids = set()
+                usable = []
+                for warranty in by_id.values():
+                    if not warranty.get('name') or warranty.get('prozentsatz') is None:
+                        continue
+                    if warranty.get('id') in seen_warranty_ids:
+                        continue
+                    seen_warranty_ids.add(warranty.get('id'))
+                    usable.append(warranty)
+                warranties_by_group[group] = usable
             
-            logger.info(f"Merged data resulted in {len(merged_items)} items across {total_products} products")
-            return merged_items
+            logger.info(f"Merging {len(products)} products with images for {len(images_by_product)} products and warranties for {len(warranties_by_group)} groups")
+            # Merge data lazily: one (product, images, warranties) tuple per product; nothing is copied
+            return self._iter_merged(products, images_by_product, warranties_by_group)
         except Exception as e:
             logger.error(f"Error merging data: {str(e)}")
             raise
+
+    @staticmethod
+    def _iter_merged(products: List[Dict], images_by_product: Dict, warranties_by_group: Dict) -> Iterator[Tuple[Dict, Sequence[str], Sequence[Dict]]]:
+        for product in products:
+            guarantee_group = product.get('Garantiegruppe')
+            yield (
+                product,
+                images_by_product.get(product.get('ProductId'), ()),
+                warranties_by_group.get(str(guarantee_group), ()) if guarantee_group is not None else ()
+            )
     
-    def process_products(self, items: List[Dict]) -> List[ShopifyProductWrapper]:
-        """Process merged items into Shopify product format"""
+    def process_products(self, items: Iterable[Tuple[Dict, Sequence[str], Sequence[Dict]]]) -> List[ShopifyProductWrapper]:
+        """Process merged (product, images, warranties) tuples from merge_data into Shopify product format"""
         try:
-            product_map = {}
+            shopify_products = []
+            seen_product_ids = set()
             
-            # Group items by ProductId
-            for item in items:
-                try:
-                    product_id = item.get('ProductId')
-                    if not product_id:
-                        logger.warning(f"Skipping item without ProductId: {item}")
-                        continue
-                    
-                    if product_id not in product_map:
-                        product_map[product_id] = {
-                            **item,
-                            '_images': [],
-                            '_images_seen': set(),
-                            '_warranties': []
-                        }
-                    
-                    current = product_map[product_id]
-                    
-                    # Process images
-                    img_raw = (item.get('base64') or 
-                              item.get('hex') or 
-                              (item.get('images', [{}])[0].get('base64') if isinstance(item.get('images'), list) else None))
-                    
-                    if img_raw:
-                        try:
-                            img_val = to_base64(img_raw)
-                            if img_val and img_val not in current['_images_seen']:
-                                current['_images'].append(img_val)
-                                current['_images_seen'].add(img_val)
-                        except Exception as e:
-                            logger.warning(f"Error processing image for product {product_id}: {str(e)}")
-                    
-                    # Process warranties
-                    if item.get('name') and item.get('prozentsatz') is not None:
-                        current['_warranties'].append({
-                            'id': item.get('id'),
-                            'name': item.get('name'),
-                            'monate': item.get('monate'),
-                            'prozentsatz': item.get('prozentsatz'),
-                            'minimum': item.get('minimum'),
-                            'garantiegruppe': item.get('garantiegruppe')
-                        })
-                except Exception as e:
-                    logger.warning(f"Error processing item for product {item.get('ProductId', 'unknown')}: {str(e)}")
+            for product, images, warranties in items:
+                product_id = product.get('ProductId')
+                if not product_id:
+                    logger.warning(f"Skipping item without ProductId: {product}")
                     continue
-            
-            # Convert to Shopify format
-            shopify_products = []
-            for product_id, product in product_map.items():
+                # merge_data attaches the same images/warranties to every row of a ProductId, so repeats add nothing
+                if product_id in seen_product_ids:
+                    continue
+                seen_product_ids.add(product_id)
+                
+                # Convert to Shopify format
                 try:
-                    shopify_product = self._create_shopify_product(product)
-                    shopify_products.append(shopify_product)
+                    shopify_products.append(self._create_shopify_product(product, images, warranties))
                 except Exception as e:
                     logger.error(f"Error creating Shopify product for {product_id}: {str(e)}")
                     # Continue with other products instead of failing completely
@@ -172,17 +190,23 @@ class ProductService:
             logger.error(f"Error processing products: {str(e)}")
             raise
     
-    def _create_shopify_product(self, product: Dict) -> ShopifyProductWrapper:
+    def _create_shopify_product(self, product: Dict, images_b64: Sequence[str] = (), warranties: Sequence[Dict] = ()) -> ShopifyProductWrapper:
         """Create Shopify product structure"""
-        product_id = product.get('ProductId', 'unknown')
-        logger.debug(f"Creating Shopify product for {product_id}")
+        get = product.get
+        product_id = get('ProductId', 'unknown')
+        logger.debug("Creating Shopify product for %s", product_id)
+        # Values read more than once below are looked up once
+        sku = str(get('ProductId'))
+        title = get('Title') or 'Untitled Product'
+        warranty_label = get('Warranty') or 'Standard'
+        warranty_group = get('Garantiegruppe')
         
         try:
-            base_price = float(product.get('Price_B2C_inclVAT'))
-            qty = int(product.get('Stock') or 0)
-            weight = float(product.get('GrossWeight') or product.get('NetWeight') or 0)
+            base_price = float(get('Price_B2C_inclVAT'))
+            qty = int(get('Stock') or 0)
+            weight = float(get('GrossWeight') or get('NetWeight') or 0)
             handle = f"prod-{product_id}"
-            has_group = int(product.get('Garantiegruppe') or 0) != 0
+            has_group = int(warranty_group or 0) != 0
         except (ValueError, TypeError) as e:
             logger.warning(f"Error parsing numeric values for product {product_id}: {str(e)}")
             # Use safe defaults
@@ -192,65 +216,47 @@ class ProductService:
             has_group = False
         
         # Process images
-        images = []
-        for img_b64 in product.get('_images', []):
-            if img_b64:
-                images.append(ShopifyImage(attachment=img_b64, alt=product.get('Title') or 'Untitled Product'))
+        images = [ShopifyImage(attachment=img_b64, alt=title) for img_b64 in images_b64 if img_b64]
         
         variants = []
-        option_values = []
+        option_values = {}  # insertion-ordered set of option values
         
         if not has_group:
             # Simple product without warranty groups
-            label = product.get('Warranty') or 'Standard'
             variants = [ShopifyVariant(
                 price=f"{base_price:.2f}",
-                sku=str(product.get('ProductId')),
+                sku=sku,
                 inventory_quantity=qty,
                 inventory_management='shopify',
                 inventory_policy='deny',
                 weight=weight,
                 weight_unit='kg',
-                option1=label
+                option1=warranty_label
             )]
-            option_values = [label]
+            option_values = {warranty_label: None}
         else:
-            # Product with warranty groups
-            grp_value = product.get('Garantiegruppe')
-            warranties = product.get('_warranties', [])
-            
-            # Filter warranties by group and remove duplicates
-            seen_warranty_ids = set()
-            filtered_warranties = []
-            
-            for warranty in warranties:
-                if (str(warranty.get('garantiegruppe')) == str(grp_value) and 
-                    warranty.get('id') not in seen_warranty_ids):
-                    seen_warranty_ids.add(warranty.get('id'))
-                    filtered_warranties.append(warranty)
-            
+            # Product with warranty groups: merge_data already narrowed warranties to this group, once per id
             # Create variants for each warranty
-            for warranty in filtered_warranties:
+            base_price_dec = Decimal(str(base_price))
+            for warranty in warranties:
                 try:
-                    prozentsatz_raw = warranty.get('prozentsatz', 0) or 0
                     minimum = float(warranty.get('minimum', 0) or 0)
-                    base_price_dec = Decimal(str(base_price))
-                    prozentsatz = Decimal(str(prozentsatz_raw))
-                    if prozentsatz == 0:
+                    rate = _warranty_rate(warranty.get('prozentsatz', 0) or 0)
+                    if rate == 0:
                         add_on = minimum
                     else:
-                        add_on = float(base_price_dec * prozentsatz / Decimal('100'))
+                        add_on = float(base_price_dec * rate)
                     price = base_price + add_on
                     sku_ext = f"G{warranty.get('id')}"
                     warranty_name = warranty.get('name', '')
                     months = warranty.get('monate', '')
                     
                     option_label = f"{warranty_name} {months} Monate"
-                    option_values.append(warranty_name)
+                    option_values[warranty_name] = None
                     
                     variants.append(ShopifyVariant(
                         price=f"{price:.2f}",
-                        sku=f"{product.get('ProductId')}-{sku_ext}",
+                        sku=f"{sku}-{sku_ext}",
                         inventory_management=None,
                         inventory_policy='deny',
                         inventory_quantity=0,
@@ -259,121 +265,73 @@ class ProductService:
                         option1=option_label
                     ))
                 except Exception as e:
-                    logger.warning(f"Error processing warranty for product {product.get('ProductId')}: {str(e)}")
+                    logger.warning(f"Error processing warranty for product {sku}: {str(e)}")
                     continue
             
             # Fallback if no variants were created
             if not variants:
-                label = product.get('Warranty') or 'Standard'
                 variants = [ShopifyVariant(
                     price=f"{base_price:.2f}",
-                    sku=str(product.get('ProductId')),
+                    sku=sku,
                     inventory_quantity=qty,
                     inventory_management='shopify',
                     inventory_policy='deny',
                     weight=weight,
                     weight_unit='kg',
-                    option1=label
+                    option1=warranty_label
                 )]
-                option_values = [label]
+                option_values = {warranty_label: None}
         
         # Build metafields
         metafields = []
         if not has_group:
-            metafields.append(ShopifyMetafield(
-                namespace='custom',
-                key='warranty',
-                value=product.get('Warranty') or '',
-                type='single_line_text_field'
-            ))
+            metafields.append(_custom_metafield('warranty', get('Warranty') or '', 'single_line_text_field'))
         
-        metafields.append(ShopifyMetafield(
-            namespace='custom',
-            key='Inventarbestand',
-            value=str(qty),
-            type='number_integer'
-        ))
-
-        metafields.append(ShopifyMetafield(
-            namespace='custom',
-            key='StockNextDelivery',
-            value=product.get('StockNextDelivery') or '',
-            type='single_line_text_field'
-        ))
-
-        metafields.append(ShopifyMetafield(
-            namespace='custom',
-            key='warranty_group',
-            value=str(product.get('Garantiegruppe')),
-            type='number_integer'
-        ))
-
-        metafields.append(ShopifyMetafield(
-            namespace='custom',
-            key='Price_B2B_Regular',
-            value=str(product.get('Price_B2B_Regular')) or 0,
-            type='number_decimal'
-        ))
-
-        metafields.append(ShopifyMetafield(
-            namespace='custom',
-            key='Price_B2B_Discounted',
-            value=str(product.get('Price_B2B_Discounted')) or 0,
-            type='number_decimal'
-        ))
+        metafields.append(_custom_metafield('Inventarbestand', str(qty), 'number_integer'))
+
+        metafields.append(_custom_metafield('StockNextDelivery', get('StockNextDelivery') or '', 'single_line_text_field'))
+
+        metafields.append(_custom_metafield('warranty_group', str(warranty_group), 'number_integer'))
+
+        metafields.append(_custom_metafield('Price_B2B_Regular', str(get('Price_B2B_Regular')) or 0, 'number_decimal'))
+
+        metafields.append(_custom_metafield('Price_B2B_Discounted', str(get('Price_B2B_Discounted')) or 0, 'number_decimal'))
 
         # Handle accessory products - only add metafield if there are actual accessories
-        accessory_products = product.get('AccessoryProducts', '').strip()
+        accessory_products = get('AccessoryProducts', '').strip()
 
         if accessory_products:
-            # Process and prefix non-empty IDs
-            prefixed_ids = [
-                f"prod-{id.strip()}" 
-                for id in accessory_products.split('|') 
-                if id.strip()
-            ]
+            accessories_json = _encode_accessories(accessory_products)
             
             # Only add metafield if we have valid accessory IDs
-            if prefixed_ids:
-                metafields.append(ShopifyMetafield(
-                    namespace='custom',
-                    key='verwandte_produkte',
-                    value=json.dumps(prefixed_ids),
-                    type='json'
-                ))
+            if accessories_json:
+                metafields.append(_custom_metafield('verwandte_produkte', accessories_json, 'json'))
 
         # New filter metafields from parsed LongDescription (varchar in DB, single_line_text)
         # Use empty string when value is missing
-        new_filters = {
-            'Bildschirmdiagonale': product.get('Bildschirmdiagonale') or '',
-            'Prozessor': product.get('Prozessor') or '',
-            'GPU': product.get('GPU') or '',
-            'RAM': product.get('RAM') or '',
-            'Speicher': product.get('Speicher') or '',
-            'Prozessorfamilie': product.get('Prozessorfamilie') or '',
-        }
-        for key, val in new_filters.items():
-            metafields.append(ShopifyMetafield(
-                namespace='custom',
-                key=key,
-                value=str(val),
-                type='single_line_text_field'
-            ))
+        metafields.extend(
+            _custom_metafield(key, str(get(key) or ''), 'single_line_text_field')
+            for key in _FILTER_METAFIELD_KEYS
+        )
                         
-        # Build final product structure
-        shopify_product = ShopifyProduct(
-            title=product.get('Title') or 'Untitled Product',
+        # Build final product structure. Every field is assembled above with its final type, so the
+        # models are constructed without re-running pydantic validation over each nested dict.
+        category_path = get('CategoryPath')
+        shopify_product = ShopifyProduct.model_construct(
+            title=title,
             handle=handle,
-            body_html=product.get('LongDescription') or product.get('DescriptionShort') or '',
-            vendor=product.get('Manufacturer'),
-            product_type=product.get('Category'),
+            body_html=get('LongDescription') or get('DescriptionShort') or '',
+            vendor=get('Manufacturer'),
+            product_type=get('Category'),
             variants=variants,
             options=[ShopifyOption(
                 name='Garantie',
-                values=list(set(option_values))
+                values=list(option_values)
             )],
             metafields=metafields,
-            images=images if images else None
+            images=images if images else None,
+            # Add tags if CategoryPath exists
+            tags=list(_split_category_path(category_path)) if category_path else None
         )
 
         # Business rule: if product has multiple variants (warranty options),
@@ -381,15 +339,11 @@ class ProductService:
         try:
             if shopify_product.variants and len(shopify_product.variants) > 1:
                 for v in shopify_product.variants:
-                    v.inventory_management = None
+                    v['inventory_management'] = None
         except Exception:
             pass
         
-        # Add tags if CategoryPath exists
-        if product.get('CategoryPath'):
-            shopify_product.tags = product.get('CategoryPath').split('|')
-        
-        return ShopifyProductWrapper(product=shopify_product)
+        return ShopifyProductWrapper.model_construct(product=shopify_product)
 
 
 product_service = ProductService()
@@ -1,11 +1,14 @@
 import httpx
 import asyncio
-from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import random
 import time as _time
 from app.core.config import settings
-from app.models.shopify import ShopifyProductWrapper
+from app.models.shopify import SHOPIFY_PRODUCT_BODY_ADAPTER, ShopifyProductWrapper
 from app.utils.helpers import gid_to_numeric_id, parse_metafield_value
 import logging
+import orjson
 from pydantic import BaseModel
  
 logger = logging.getLogger(__name__)
@@ -22,34 +25,131 @@ class ShopifyService:
         }
         self._primary_location_id: Optional[int] = None
         self._last_rest_ts: float = 0.0
+        # Fill level of the REST leaky bucket as last reported by X-Shopify-Shop-Api-Call-Limit (0..1)
+        self._rest_bucket_fill: float = 1.0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Shared HTTP/2 client, created on first use so connections and TLS sessions are reused across calls"""
+        if self._client is None:
+            # Idle connections are kept for 30s (httpx default: 5s) so paced calls still find a warm one
+            limits = httpx.Limits(
+                max_connections=settings.shopify_max_connections,
+                max_keepalive_connections=settings.shopify_max_connections,
+                keepalive_expiry=30.0
+            )
+            # HTTP/2 lets concurrent requests share one TLS connection as multiplexed streams
+            self._client = httpx.AsyncClient(limits=limits, timeout=30.0, http2=True)
+        return self._client
+
+    @asynccontextmanager
+    async def _client_session(self) -> AsyncIterator[httpx.AsyncClient]:
+        """Yield the shared client; unlike `async with httpx.AsyncClient()` it stays open afterwards"""
+        yield self._get_client()
+
+    async def aclose(self) -> None:
+        """Close the shared client (application shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "ShopifyService":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    @staticmethod
+    async def _gather_paced(items: List[Any], worker: Callable[[Any], Awaitable[Any]],
+                            concurrency: int, per_second: float) -> List[Any]:
+        """Run worker(item) for every item with at most `concurrency` in flight and starts spaced
+        1/per_second apart; results (or raised exceptions) come back in input order."""
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        start_interval = 1.0 / per_second if per_second > 0 else 0.0
+        next_start = _time.monotonic()
+
+        async def _bounded(item: Any) -> Any:
+            nonlocal next_start
+            async with semaphore:
+                now = _time.monotonic()
+                slot = max(now, next_start)
+                next_start = slot + start_interval
+                if slot > now:
+                    await asyncio.sleep(slot - now)
+                return await worker(item)
+
+        return await asyncio.gather(*(_bounded(item) for item in items), return_exceptions=True)
+
+    def _note_call_limit(self, resp: httpx.Response) -> None:
+        """Remember how full the REST bucket is, from a header like "32/40"."""
+        call_limit = resp.headers.get('X-Shopify-Shop-Api-Call-Limit')
+        if not call_limit:
+            return
+        try:
+            used, cap = call_limit.split('/', 1)
+            self._rest_bucket_fill = int(used) / max(int(cap), 1)
+        except ValueError:
+            pass
+
+    @staticmethod
+    def _retry_after(resp: httpx.Response, default: float) -> float:
+        try:
+            return float(resp.headers.get('Retry-After') or default)
+        except ValueError:
+            return default
+
+    @staticmethod
+    def _graphql_throttle_delay(data: Dict[str, Any]) -> float:
+        """Seconds until the query-cost bucket can pay for another query like the last one,
+        from the cost extension of a GraphQL response; 0 when it already can."""
+        cost = (data.get("extensions") or {}).get("cost") or {}
+        throttle = cost.get("throttleStatus") or {}
+        needed = cost.get("requestedQueryCost")
+        available = throttle.get("currentlyAvailable")
+        restore_rate = throttle.get("restoreRate")
+        if not all(isinstance(v, (int, float)) for v in (needed, available, restore_rate)) or restore_rate <= 0:
+            return 0.0
+        return max(0.0, (needed - available) / restore_rate)
+
+    @staticmethod
+    def _error_text(resp: httpx.Response, limit: int = 1024) -> str:
+        """Start of a failed response's body for logs and error results, without decoding all of it."""
+        return resp.content[:limit].decode('utf-8', 'replace')
+
+    async def _send_with_retry(self, client: httpx.AsyncClient, method: str, url: str, body: bytes,
+                               timeout: float = 30.0, max_retries: int = 5) -> httpx.Response:
+        """Send a pre-serialized JSON body, waiting out 429s as told by Retry-After.
+        Other errors are returned as is: a retried create could duplicate the product."""
+        for attempt in range(max_retries):
+            resp = await client.request(method, url, headers=self.headers, content=body, timeout=timeout)
+            self._note_call_limit(resp)
+            if resp.status_code != 429:
+                return resp
+            await asyncio.sleep(self._retry_after(resp, 1.0))
+        return resp
 
     async def _rest_call(self, client: httpx.AsyncClient, method: str, path: str, json: Optional[Dict[str, Any]] = None,
                          max_retries: int = 6) -> httpx.Response:
         """Rate-limited REST call with retry/backoff for 429/5xx.
-        Enforces ~2 req/sec by spacing calls at least 0.55s apart.
+        Spaces calls at least 0.55s apart (~2 req/sec) once the REST bucket is half full;
+        below that Shopify accepts bursts, so calls go out immediately.
         Path should be like f"/admin/api/{self.api_version}/..."
         """
-        # Space out requests to ~2 rps
+        # Space out requests to ~2 rps while the bucket is filling up
         since = _time.time() - self._last_rest_ts
-        if since < 0.55:
+        if since < 0.55 and self._rest_bucket_fill >= 0.5:
             await asyncio.sleep(0.55 - since)
         url = f"{self.shop_url}{path}"
+        body = orjson.dumps(json) if json is not None else None
         backoff = 0.6
         for attempt in range(max_retries):
             try:
-                resp = await client.request(method.upper(), url, headers=self.headers, json=json, timeout=60.0)
+                resp = await client.request(method.upper(), url, headers=self.headers, content=body, timeout=60.0)
                 self._last_rest_ts = _time.time()
+                self._note_call_limit(resp)
                 if resp.status_code in (429, 500, 502, 503, 504):
                     # Respect Retry-After if present
-                    retry_after = resp.headers.get('Retry-After')
-                    if retry_after:
-                        try:
-                            wait_s = float(retry_after)
-                        except Exception:
-                            wait_s = backoff
-                    else:
-                        wait_s = backoff
-                    await asyncio.sleep(wait_s)
+                    await asyncio.sleep(self._retry_after(resp, backoff))
                     backoff = min(backoff * 2, 8)
                     continue
                 return resp
@@ -62,13 +162,16 @@ class ShopifyService:
     async def test_connection(self) -> bool:
         """Test Shopify API connection"""
         try:
-            async with httpx.AsyncClient() as client:
+            async with self._client_session() as client:
                 response = await client.get(
                     f"{self.shop_url}/admin/api/{self.api_version}/shop.json",
                     headers={'X-Shopify-Access-Token': self.access_token}
                 )
                 if response.status_code != 200:
-                    logger.error(f"Shopify connection test non-200: {response.status_code} - {response.text}")
+                    logger.error(f"Shopify connection test non-200: {response.status_code} - {self._error_text(response)}")
+                http_version = getattr(response, 'http_version', None)
+                if http_version and http_version != 'HTTP/2':
+                    logger.info(f"Shopify connection negotiated {http_version}; requests will not be multiplexed")
                 return response.status_code == 200
         except Exception as e:
             logger.error(f"Shopify connection test failed: {str(e)}")
@@ -149,209 +252,240 @@ class ShopifyService:
         )
 
         all_products: List[Dict[str, Any]] = []
-        after: Optional[str] = None
         page_size = min(max(1, limit), 250)
-        try:
-            async with httpx.AsyncClient() as client:
-                while True:
-                    # Throttle-aware request with retries
-                    max_retries = 6
-                    backoff = 0.5
-                    for attempt in range(max_retries):
-                        resp = await self._graphql(client, query, {"first": page_size, "after": after})
-                        if resp.status_code == 200:
-                            break
-                        if resp.status_code in (429, 500, 502, 503, 504):
-                            await asyncio.sleep(backoff)
-                            backoff = min(backoff * 2, 8)
-                            continue
-                        logger.error(f"GraphQL products fetch failed: {resp.status_code} - {resp.text}")
-                        return all_products
 
-                    if resp.status_code != 200:
-                        logger.error(f"GraphQL products fetch failed after retries: {resp.status_code}")
-                        return all_products
+        async def _fetch_page(client: httpx.AsyncClient, after: Optional[str], delay: float = 0.0) -> Optional[Dict[str, Any]]:
+            """One products page (throttle-aware, with retries); None when the fetch failed"""
+            if delay:
+                await asyncio.sleep(delay)
+            max_retries = 6
+            for attempt in range(max_retries):
+                resp = await self._graphql(client, query, {"first": page_size, "after": after})
+                backoff = min(0.5 * 2 ** attempt, 8) * (1 + random.uniform(0, 0.5))
+                if resp.status_code in (429, 500, 502, 503, 504):
+                    await asyncio.sleep(self._retry_after(resp, backoff))
+                    continue
+                if resp.status_code != 200:
+                    logger.error(f"GraphQL products fetch failed: {resp.status_code} - {self._error_text(resp)}")
+                    return None
 
-                    data = resp.json() or {}
-                    # Sanity check: GraphQL errors
-                    if isinstance(data.get("errors"), list) and data["errors"]:
-                        logger.error(f"GraphQL error on products fetch: {data['errors']}")
-                        return all_products
-                    # Optional: respect throttle status
-                    try:
-                        throttle = ((data.get("extensions") or {}).get("cost") or {}).get("throttleStatus") or {}
-                        remaining = throttle.get("currentlyAvailable")
-                        restore_rate = throttle.get("restoreRate") or 1
-                        if isinstance(remaining, int) and remaining < 10:
-                            await asyncio.sleep(max(1, int(10 / max(restore_rate, 1))))
-                    except Exception:
-                        pass
+                data = orjson.loads(resp.content) or {}
+                errors = data.get("errors")
+                # Sanity check: GraphQL errors; a throttled query comes back as 200 and is retried once the bucket refills
+                if isinstance(errors, list) and errors:
+                    if any(((err or {}).get("extensions") or {}).get("code") == "THROTTLED" for err in errors):
+                        await asyncio.sleep(self._graphql_throttle_delay(data) or backoff)
+                        continue
+                    logger.error(f"GraphQL error on products fetch: {errors}")
+                    return None
+                return data
+
+            logger.error(f"GraphQL products fetch failed after retries: {resp.status_code}")
+            return None
 
-                    edges = (((data.get("data") or {}).get("products") or {}).get("edges") or [])
-                    for edge in edges:
-                        node = (edge or {}).get("node") or {}
-                        all_products.append(_map_product(node))
-                    page_info = (((data.get("data") or {}).get("products") or {}).get("pageInfo") or {})
+        pending: Optional[asyncio.Task] = None
+        try:
+            async with self._client_session() as client:
+                data = await _fetch_page(client, None)
+                while data is not None:
+                    products_data = (data.get("data") or {}).get("products") or {}
+                    page_info = products_data.get("pageInfo") or {}
                     if page_info.get("hasNextPage"):
-                        after = page_info.get("endCursor")
-                        await asyncio.sleep(0.1)
-                        continue
-                    break
+                        # Only wait when the query-cost bucket cannot pay for the next page yet
+                        delay = self._graphql_throttle_delay(data)
+                        # Request the next page now and map this one while it is in flight
+                        pending = asyncio.create_task(_fetch_page(client, page_info.get("endCursor"), delay))
+                        # Yield once so the task starts sending before mapping begins
+                        await asyncio.sleep(0)
+
+                    nodes = [(edge or {}).get("node") or {} for edge in (products_data.get("edges") or [])]
+                    if pending is not None:
+                        # Map in a worker thread so the event loop keeps driving the in-flight request
+                        all_products.extend(await asyncio.to_thread(lambda: [_map_product(node) for node in nodes]))
+                    else:
+                        all_products.extend(_map_product(node) for node in nodes)
+
+                    if pending is None:
+                        break
+                    data = await pending
+                    pending = None
             logger.info(f"Fetched {len(all_products)} products from Shopify via GraphQL")
             return all_products
         except Exception as e:
             logger.error(f"Error fetching products from Shopify (GraphQL): {str(e)}")
             raise
+        finally:
+            if pending is not None:
+                pending.cancel()
    
+    @staticmethod
+    def _map_product_by_handle(node: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a productByHandle node to the REST-like product struct callers expect."""
+        out = {
+            "id": gid_to_numeric_id(node.get("id")),
+            "handle": node.get("handle"),
+            "title": node.get("title"),
+            "body_html": node.get("bodyHtml"),
+            "vendor": node.get("vendor"),
+            "product_type": node.get("productType"),
+            "tags": node.get("tags") or [],
+        }
+        # Minimal variants for callers that read price/inventory
+        variants_nodes = (node.get("variants", {}).get("nodes") or [])
+        variants_out: List[Dict[str, Any]] = []
+        for v in variants_nodes:
+            option_names = [so.get("value") for so in (v.get("selectedOptions") or [])]
+            variants_out.append({
+                "price": v.get("price"),
+                "sku": v.get("sku"),
+                "inventory_quantity": v.get("inventoryQuantity"),
+                "inventory_management": v.get("inventoryManagement"),
+                "inventory_policy": v.get("inventoryPolicy"),
+                "weight": v.get("weight"),
+                "weight_unit": v.get("weightUnit"),
+                "option1": option_names[0] if len(option_names) > 0 else None,
+            })
+        if variants_out:
+            out["variants"] = variants_out
+        return out
+
     async def get_product_by_handle(self, handle: str) -> Optional[Dict[str, Any]]:
         """Get a specific product by handle via GraphQL and map to REST-like struct."""
+        try:
+            return (await self.get_products_by_handles([handle])).get(handle)
+        except Exception:
+            # Already logged by get_products_by_handles; single lookups keep reporting failures as None
+            return None
 
-        def _map(node: Dict[str, Any]) -> Dict[str, Any]:
-            out = {
-                "id": gid_to_numeric_id(node.get("id")),
-                "handle": node.get("handle"),
-                "title": node.get("title"),
-                "body_html": node.get("bodyHtml"),
-                "vendor": node.get("vendor"),
-                "product_type": node.get("productType"),
-                "tags": node.get("tags") or [],
-            }
-            # Minimal variants for callers that read price/inventory
-            variants_nodes = (node.get("variants", {}).get("nodes") or [])
-            variants_out: List[Dict[str, Any]] = []
-            for v in variants_nodes:
-                option_names = [so.get("value") for so in (v.get("selectedOptions") or [])]
-                variants_out.append({
-                    "price": v.get("price"),
-                    "sku": v.get("sku"),
-                    "inventory_quantity": v.get("inventoryQuantity"),
-                    "inventory_management": v.get("inventoryManagement"),
-                    "inventory_policy": v.get("inventoryPolicy"),
-                    "weight": v.get("weight"),
-                    "weight_unit": v.get("weightUnit"),
-                    "option1": option_names[0] if len(option_names) > 0 else None,
-                })
-            if variants_out:
-                out["variants"] = variants_out
-            return out
-
-        query = (
-            "query($handle:String!) { "
-            "  productByHandle(handle: $handle) { "
-            "    id handle title bodyHtml vendor productType tags "
-            "    variants(first: 25) { nodes { "
-            "      price sku inventoryQuantity "
-            "      selectedOptions { name value } "
-            "    } } "
-            "  } "
-            "}"
+    async def get_products_by_handles(self, handles: List[str], chunk_size: int = 25) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Look up many handles with one aliased productByHandle query per chunk_size handles.
+        Maps every requested handle to its REST-like product, or None when it was not found;
+        a failed lookup raises, so callers can tell it apart from a missing product."""
+        unique_handles = list(dict.fromkeys(handles))
+        results: Dict[str, Optional[Dict[str, Any]]] = dict.fromkeys(unique_handles)
+        chunk_size = max(1, chunk_size)
+        fields = (
+            "id handle title bodyHtml vendor productType tags "
+            "variants(first: 25) { nodes { "
+            "  price sku inventoryQuantity "
+            "  selectedOptions { name value } "
+            "} } "
         )
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await self._graphql(client, query, {"handle": handle})
-                if resp.status_code != 200:
-                    logger.error(f"Failed to fetch product {handle} (GraphQL): {resp.status_code} - {resp.text}")
-                    return None
-                data = resp.json() or {}
-                if isinstance(data.get("errors"), list) and data["errors"]:
-                    logger.error(f"GraphQL error fetching product {handle}: {data['errors']}")
-                    return None
-                node = ((data.get("data") or {}).get("productByHandle") or None)
-                if not node:
-                    return None
-                return _map(node)
+            async with self._client_session() as client:
+                for start in range(0, len(unique_handles), chunk_size):
+                    chunk = unique_handles[start:start + chunk_size]
+                    # p0: productByHandle(handle: $h0) { ... } p1: ... - one round-trip for the whole chunk
+                    query = (
+                        "query(" + ", ".join(f"$h{i}:String!" for i in range(len(chunk))) + ") { "
+                        + " ".join(f"p{i}: productByHandle(handle: $h{i}) {{ {fields}}}" for i in range(len(chunk)))
+                        + " }"
+                    )
+                    resp = await self._graphql(client, query, {f"h{i}": h for i, h in enumerate(chunk)})
+                    if resp.status_code != 200:
+                        raise RuntimeError(f"Failed to fetch products {chunk} (GraphQL): {resp.status_code} - {self._error_text(resp)}")
+                    data = orjson.loads(resp.content) or {}
+                    if isinstance(data.get("errors"), list) and data["errors"]:
+                        raise RuntimeError(f"GraphQL error fetching products {chunk}: {data['errors']}")
+                    nodes = data.get("data") or {}
+                    for i, handle in enumerate(chunk):
+                        node = nodes.get(f"p{i}")
+                        if node:
+                            results[handle] = self._map_product_by_handle(node)
         except Exception as e:
-            logger.error(f"Error fetching product {handle} (GraphQL): {str(e)}")
-            return None
+            logger.error(f"Error fetching products by handle (GraphQL): {str(e)}")
+            raise
+        return results
    
-    async def update_products_by_product_ids(self, product_ids: List[str]) -> List[Dict[str, Any]]:
-        """Update multiple products in Shopify by their productIds, fetching data from database"""
+    async def update_products_by_product_ids(self, product_ids: List[str], concurrency: int = 4,
+                                             per_second: float = 2.0) -> List[Dict[str, Any]]:
+        """Update multiple products in Shopify by their productIds, fetching data from database.
+        Up to `concurrency` updates run at once, started at most `per_second` times a second.
+        """
         try:
-            from app.services.database_service import DatabaseService
-            from app.services.product_service import ProductService
+            from app.services.database_service import database_service
+            from app.services.product_service import product_service
            
-            # Initialize services
-            db_service = DatabaseService()
-            product_service = ProductService()
-           
-            # Fetch all product data from database
-            products = db_service.fetch_products()
-            images = db_service.fetch_images()
-            warranties = db_service.fetch_warranties()
+            # Fetch only the requested products and their images/warranties over a single connection
+            with database_service.session() as db:
+                products = db.fetch_products_by_ids(list(dict.fromkeys(product_ids)))
+                images = db.fetch_images_by_supplier_aids([p.get('ProductId') for p in products])
+                groups = set()
+                for p in products:
+                    try:
+                        if p.get('Garantiegruppe') is not None:
+                            groups.add(int(p.get('Garantiegruppe')))
+                    except (TypeError, ValueError):
+                        continue
+                warranties = db.fetch_warranties_by_groups(list(groups)) if groups else []
            
             # Create lookup for products by ProductId
             products_by_id = {product.get('ProductId'): product for product in products}
+            
+            # Merge and transform all requested products in one pass, then look each one up by handle
+            shopify_products_by_handle = {
+                wrapper.product.handle: wrapper
+                for wrapper in product_service.process_products(product_service.merge_data(products, images, warranties))
+            }
            
-            results = []
-           
-            for product_id in product_ids:
+            async def _update_one(product_id: str) -> Dict[str, Any]:
                 try:
                     # Find the specific product
                     target_product = products_by_id.get(product_id)
                    
                     if not target_product:
-                        results.append({
+                        return {
                             'status': 'error',
                             'product_id': product_id,
                             'error': f'Product with ID "{product_id}" not found in database'
-                        })
-                        continue
+                        }
                    
-                    # Merge data for this product
-                    merged_items = product_service.merge_data([target_product], images, warranties)
+                    shopify_product = shopify_products_by_handle.get(f"prod-{target_product.get('ProductId')}")
                    
-                    # Process into Shopify format
-                    shopify_products = product_service.process_products(merged_items)
-                   
-                    if not shopify_products:
-                        results.append({
+                    if not shopify_product:
+                        return {
                             'status': 'error',
                             'product_id': product_id,
                             'error': 'Failed to process product data for Shopify'
-                        })
-                        continue
+                        }
                    
-                    # Get the processed Shopify product data
-                    shopify_product_data = shopify_products[0].product.model_dump()
-                   
-                    # Construct the handle format used in this system
-                    handle = f"prod-{product_id}"
+                    # Serialize the processed product once, straight to the JSON body; its handle is already prod-<ProductId>
+                    body = SHOPIFY_PRODUCT_BODY_ADAPTER.dump_json(shopify_product)
+                    handle = shopify_product.product.handle
                    
                     # Update the product in Shopify
-                    async with httpx.AsyncClient() as client:
-                        response = await client.put(
+                    async with self._client_session() as client:
+                        response = await self._send_with_retry(
+                            client,
+                            'PUT',
                             f"{self.shop_url}/admin/api/{self.api_version}/products.json?handle={handle}",
-                            headers=self.headers,
-                            json={"product": shopify_product_data},
-                            timeout=30.0
+                            body
                         )
                        
                         if response.status_code == 200:
-                            results.append({
+                            return {
                                 'status': 'success',
                                 'product_id': product_id,
                                 'handle': handle,
-                                'title': shopify_product_data.get('title')
-                            })
-                        else:
-                            results.append({
-                                'status': 'error',
-                                'product_id': product_id,
-                                'error': response.text,
-                                'status_code': response.status_code
-                            })
-                   
-                    # Rate limiting - wait a bit between requests
-                    await asyncio.sleep(0.5)
+                                'title': shopify_product.product.title
+                            }
+                        return {
+                            'status': 'error',
+                            'product_id': product_id,
+                            'error': self._error_text(response),
+                            'status_code': response.status_code
+                        }
                    
                 except Exception as e:
                     logger.error(f"Error updating product {product_id}: {str(e)}")
-                    results.append({
+                    return {
                         'status': 'error',
                         'product_id': product_id,
                         'error': str(e)
-                    })
+                    }
            
+            # Several PUTs in flight at once, with starts paced to stay within Shopify's REST rate
+            results = await self._gather_paced(product_ids, _update_one, concurrency=concurrency, per_second=per_second)
             return results
                    
         except Exception as e:
@@ -373,12 +507,12 @@ class ShopifyService:
                         variant['inventory_management'] = None
                 logger.info(f"Set inventory_management=None for all variants in product {shopify_id} (multiple variants detected)")
             
-            async with httpx.AsyncClient() as client:
-                response = await client.put(
+            async with self._client_session() as client:
+                response = await self._send_with_retry(
+                    client,
+                    'PUT',
                     f"{self.shop_url}/admin/api/{self.api_version}/products/{shopify_id}.json",
-                    headers=self.headers,
-                    json={"product": product_data},
-                    timeout=30.0
+                    orjson.dumps({"product": product_data})
                 )
                
                 if response.status_code == 200:
@@ -392,7 +526,7 @@ class ShopifyService:
                     return {
                         'status': 'error',
                         'product_id': product_data.get('handle'),
-                        'error': response.text,
+                        'error': self._error_text(response),
                         'status_code': response.status_code
                     }
                    
@@ -442,11 +576,11 @@ class ShopifyService:
             if product_data.get('images'):
                 shopify_product_data["product"]["images"] = product_data['images']
            
-            async with httpx.AsyncClient() as client:
+            async with self._client_session() as client:
                 response = await self._rest_call(client, 'PUT', f"/admin/api/{self.api_version}/products/{product_id}.json", json=shopify_product_data)
                
                 if response.status_code == 200:
-                    updated_product = response.json()
+                    updated_product = orjson.loads(response.content)
                     logger.info(f"Successfully updated product {handle} in Shopify")
 
                     # Ensure inventory levels are updated, since Product PUT ignores inventory quantities
@@ -490,11 +624,11 @@ class ShopifyService:
                         "data": updated_product
                     }
                 else:
-                    logger.error(f"Failed to update product {handle}: {response.status_code} - {response.text}")
+                    logger.error(f"Failed to update product {handle}: {response.status_code} - {self._error_text(response)}")
                     return {
                         "status": "error",
                         "message": f"Failed to update product {handle}: {response.status_code}",
-                        "response": response.text
+                        "response": self._error_text(response)
                     }
                    
         except Exception as e:
@@ -517,8 +651,12 @@ class ShopifyService:
                 candidates.add(f"PROD-{pid}")
         except Exception:
             pass
-        for h in candidates:
-            found = await self.get_product_by_handle(h)
+        try:
+            found_by_handle = await self.get_products_by_handles(list(candidates))
+        except Exception:
+            # Already logged; fall through to the SKU search below
+            found_by_handle = {}
+        for found in found_by_handle.values():
             if found and found.get('id'):
                 return found['id']
 
@@ -537,11 +675,11 @@ class ShopifyService:
             "query($q:String!){ products(first:1, query:$q){ edges { node { id handle variants(first:5){ nodes { sku } } } } } }"
         )
         try:
-            async with httpx.AsyncClient() as client:
+            async with self._client_session() as client:
                 resp = await self._graphql(client, query, {"q": f"sku:{pid_from_handle}"})
                 if resp.status_code != 200:
                     return None
-                data = resp.json() or {}
+                data = orjson.loads(resp.content) or {}
                 edges = (((data.get('data') or {}).get('products') or {}).get('edges') or [])
                 for edge in edges:
                     node = (edge or {}).get('node') or {}
@@ -561,9 +699,9 @@ class ShopifyService:
         resp = await self._rest_call(client, 'GET', f"/admin/api/{self.api_version}/locations.json")
         resp = resp  # keep type hints happy
         if resp.status_code != 200:
-            logger.error(f"Failed to fetch locations: {resp.status_code} - {resp.text}")
+            logger.error(f"Failed to fetch locations: {resp.status_code} - {self._error_text(resp)}")
             return None
-        data = resp.json() or {}
+        data = orjson.loads(resp.content) or {}
         locations = data.get('locations') or []
         if not locations:
             return None
@@ -589,14 +727,14 @@ class ShopifyService:
         if not expected_variants:
             return
         
-        async with httpx.AsyncClient() as client:
+        async with self._client_session() as client:
             # 1) Fetch REST product to obtain inventory_item_id for the variant
             resp = await self._rest_call(client, 'GET', f"/admin/api/{self.api_version}/products/{product_id}.json")
             if resp.status_code != 200:
                 logger.warning(f"Cannot fetch product {product_id} for inventory: {resp.status_code}")
                 return
             
-            product = (resp.json() or {}).get('product') or {}
+            product = (orjson.loads(resp.content) or {}).get('product') or {}
             variants = product.get('variants') or []
             
             if not variants:
@@ -648,7 +786,7 @@ class ShopifyService:
                         json=put_body
                     )
                     if v_put.status_code not in (200, 201):
-                        logger.warning(f"Failed enabling inventory_management for variant {variant_id}: {v_put.status_code} - {v_put.text}")
+                        logger.warning(f"Failed enabling inventory_management for variant {variant_id}: {v_put.status_code} - {self._error_text(v_put)}")
                         return
                 except Exception as e:
                     logger.warning(f"Error enabling inventory_management for variant {variant_id}: {str(e)}")
@@ -664,7 +802,7 @@ class ShopifyService:
                         json=ii_body
                     )
                     if ii_put.status_code not in (200, 201):
-                        logger.warning(f"Failed enabling tracked for inventory_item {inventory_item_id}: {ii_put.status_code} - {ii_put.text}")
+                        logger.warning(f"Failed enabling tracked for inventory_item {inventory_item_id}: {ii_put.status_code} - {self._error_text(ii_put)}")
                         return
                 except Exception as e:
                     logger.warning(f"Error enabling tracked for inventory_item {inventory_item_id}: {str(e)}")
@@ -688,7 +826,7 @@ class ShopifyService:
                 if set_resp.status_code not in (200, 201):
                     logger.warning(
                         f"Inventory set failed for product {product_id}, variant {variant_id}, "
-                        f"inventory_item {inventory_item_id}: {set_resp.status_code} - {set_resp.text}"
+                        f"inventory_item {inventory_item_id}: {set_resp.status_code} - {self._error_text(set_resp)}"
                     )
                 else:
                     logger.info(f"Successfully updated inventory for product {product_id} to {expected_qty}")
@@ -701,13 +839,13 @@ class ShopifyService:
         If desired_value is falsy (None/""), delete the metafield if it exists.
         If desired_value is non-empty, upsert it.
         """
-        async with httpx.AsyncClient() as client:
+        async with self._client_session() as client:
             # 1) List existing product metafields
             list_resp = await self._rest_call(client, 'GET', f"/admin/api/{self.api_version}/products/{product_id}/metafields.json")
             if list_resp.status_code != 200:
                 logger.warning(f"Cannot list metafields for product {product_id}: {list_resp.status_code}")
                 return
-            metafields = (list_resp.json() or {}).get('metafields') or []
+            metafields = (orjson.loads(list_resp.content) or {}).get('metafields') or []
             target = None
             for mf in metafields:
                 if mf.get('namespace') == 'custom' and mf.get('key') == 'StockNextDelivery':
@@ -719,7 +857,7 @@ class ShopifyService:
                 if target and target.get('id'):
                     del_resp = await self._rest_call(client, 'DELETE', f"/admin/api/{self.api_version}/metafields/{target['id']}.json")
                     if del_resp.status_code not in (200, 204):
-                        logger.warning(f"Failed deleting StockNextDelivery for product {product_id}: {del_resp.status_code} - {del_resp.text}")
+                        logger.warning(f"Failed deleting StockNextDelivery for product {product_id}: {del_resp.status_code} - {self._error_text(del_resp)}")
                 return
 
             # 3) desired non-empty -> upsert
@@ -733,7 +871,7 @@ class ShopifyService:
                 }
                 put_resp = await self._rest_call(client, 'PUT', f"/admin/api/{self.api_version}/metafields/{target['id']}.json", json=put_body)
                 if put_resp.status_code != 200:
-                    logger.warning(f"Failed updating StockNextDelivery for product {product_id}: {put_resp.status_code} - {put_resp.text}")
+                    logger.warning(f"Failed updating StockNextDelivery for product {product_id}: {put_resp.status_code} - {self._error_text(put_resp)}")
                 return
 
             # Create new metafield
@@ -749,20 +887,20 @@ class ShopifyService:
             }
             post_resp = await self._rest_call(client, 'POST', f"/admin/api/{self.api_version}/metafields.json", json=post_body)
             if post_resp.status_code not in (200, 201):
-                logger.warning(f"Failed creating StockNextDelivery for product {product_id}: {post_resp.status_code} - {post_resp.text}")
+                logger.warning(f"Failed creating StockNextDelivery for product {product_id}: {post_resp.status_code} - {self._error_text(post_resp)}")
    
     async def _sync_accessory_products_metafield(self, product_id: int, desired_value: Optional[str]) -> None:
         """Ensure the product's verwandte_produkte metafield matches desired_value.
         If desired_value is falsy (None/""), delete the metafield if it exists.
         If desired_value is non-empty, upsert it.
         """
-        async with httpx.AsyncClient() as client:
+        async with self._client_session() as client:
             # 1) List existing product metafields
             list_resp = await self._rest_call(client, 'GET', f"/admin/api/{self.api_version}/products/{product_id}/metafields.json")
             if list_resp.status_code != 200:
                 logger.warning(f"Cannot list metafields for product {product_id}: {list_resp.status_code}")
                 return
-            metafields = (list_resp.json() or {}).get('metafields') or []
+            metafields = (orjson.loads(list_resp.content) or {}).get('metafields') or []
             target = None
             for mf in metafields:
                 if mf.get('namespace') == 'custom' and mf.get('key') == 'verwandte_produkte':
@@ -774,7 +912,7 @@ class ShopifyService:
                 if target and target.get('id'):
                     del_resp = await self._rest_call(client, 'DELETE', f"/admin/api/{self.api_version}/metafields/{target['id']}.json")
                     if del_resp.status_code not in (200, 204):
-                        logger.warning(f"Failed deleting verwandte_produkte for product {product_id}: {del_resp.status_code} - {del_resp.text}")
+                        logger.warning(f"Failed deleting verwandte_produkte for product {product_id}: {del_resp.status_code} - {self._error_text(del_resp)}")
                 return
 
             # 3) desired non-empty -> upsert
@@ -788,7 +926,7 @@ class ShopifyService:
                 }
                 put_resp = await self._rest_call(client, 'PUT', f"/admin/api/{self.api_version}/metafields/{target['id']}.json", json=put_body)
                 if put_resp.status_code != 200:
-                    logger.warning(f"Failed updating verwandte_produkte for product {product_id}: {put_resp.status_code} - {put_resp.text}")
+                    logger.warning(f"Failed updating verwandte_produkte for product {product_id}: {put_resp.status_code} - {self._error_text(put_resp)}")
                 return
 
             # Create new metafield
@@ -804,12 +942,12 @@ class ShopifyService:
             }
             post_resp = await self._rest_call(client, 'POST', f"/admin/api/{self.api_version}/metafields.json", json=post_body)
             if post_resp.status_code not in (200, 201):
-                logger.warning(f"Failed creating verwandte_produkte for product {product_id}: {post_resp.status_code} - {post_resp.text}")
+                logger.warning(f"Failed creating verwandte_produkte for product {product_id}: {post_resp.status_code} - {self._error_text(post_resp)}")
 
     async def delete_product_by_id(self, product_id: int) -> Dict[str, Any]:
         """Delete a Shopify product by its numeric Shopify ID."""
         try:
-            async with httpx.AsyncClient() as client:
+            async with self._client_session() as client:
                 response = await client.delete(
                     f"{self.shop_url}/admin/api/{self.api_version}/products/{product_id}.json",
                     headers=self.headers,
@@ -817,14 +955,13 @@ class ShopifyService:
                 )
                 if response.status_code in (200, 204):
                     return {"status": "success", "shopify_id": product_id}
-                return {"status": "error", "shopify_id": product_id, "response": response.text, "code": response.status_code}
+                return {"status": "error", "shopify_id": product_id, "response": self._error_text(response), "code": response.status_code}
         except Exception as e:
             logger.error(f"Error deleting Shopify product {product_id}: {str(e)}")
             return {"status": "error", "shopify_id": product_id, "error": str(e)}
    
     async def send_products_batch(self, products: List[ShopifyProductWrapper], batch_size: int = 10) -> List[Dict[str, Any]]:
-        """Send products to Shopify in robustly limited batches for large sets."""
-        results = []
+        """Send products to Shopify with at most batch_size requests in flight, for large sets."""
         # Ensure batch_size is a valid positive integer
         try:
             batch_size = int(batch_size)
@@ -832,21 +969,16 @@ class ShopifyService:
             batch_size = None
         if not batch_size or batch_size <= 0:
             batch_size = len(products) if len(products) > 0 else 1
-        async with httpx.AsyncClient() as client:
-        
-        
-            for i in range(0, len(products), batch_size):
-                batch = products[i:i + batch_size]
-                tasks = []
-                for product in batch:
-                    task = self._send_single_product(client, product)
-                    tasks.append(task)
-                batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-                results.extend(batch_results)
-
-                # Rate limiting - wait 1 second between batches
-                if i + batch_size < len(products):
-                    await asyncio.sleep(1)
+        # Keep up to batch_size requests in flight at all times instead of waiting on the slowest
+        # request of each batch; starts are spaced so the average rate stays at batch_size per second.
+        # Each body is serialized by its own worker, so at most batch_size bodies (with their base64 images) exist at once
+        async with self._client_session() as client:
+            results = await self._gather_paced(
+                products,
+                lambda product: self._send_single_product(client, product),
+                concurrency=batch_size,
+                per_second=batch_size
+            )
 
         return results
 
@@ -862,7 +994,7 @@ class ShopifyService:
                 'Content-Type': 'application/json',
                 'X-Shopify-Access-Token': self.access_token
             },
-            json=payload,
+            content=orjson.dumps(payload),
             timeout=60.0
         )
 
@@ -879,9 +1011,9 @@ class ShopifyService:
             "  } "
             "}"
         )
-        async with httpx.AsyncClient() as client:
+        async with self._client_session() as client:
             resp = await self._graphql(client, mutation, {"query": bulk_query})
-            data = resp.json() or {}
+            data = orjson.loads(resp.content) or {}
             # Sanity: log userErrors if present
             ue = (((data.get('data') or {}).get('bulkOperationRunQuery') or {}).get('userErrors') or [])
             if ue:
@@ -945,9 +1077,9 @@ class ShopifyService:
             "  } "
             "}"
         )
-        async with httpx.AsyncClient() as client:
+        async with self._client_session() as client:
             resp = await self._graphql(client, mutation, {"query": bulk_query})
-            data = resp.json() or {}
+            data = orjson.loads(resp.content) or {}
             ue = (((data.get('data') or {}).get('bulkOperationRunQuery') or {}).get('userErrors') or [])
             if ue:
                 logger.error(f"Bulk full start userErrors: {ue}")
@@ -958,9 +1090,9 @@ class ShopifyService:
         query = (
             "{ currentBulkOperation { id status errorCode url createdAt completedAt objectCount fileSize } }"
         )
-        async with httpx.AsyncClient() as client:
+        async with self._client_session() as client:
             resp = await self._graphql(client, query)
-            data = resp.json() or {}
+            data = orjson.loads(resp.content) or {}
             op = (data.get('data') or {}).get('currentBulkOperation') or {}
             status = op.get('status')
             error_code = op.get('errorCode')
@@ -971,21 +1103,21 @@ class ShopifyService:
     async def fetch_bulk_result_file(self, url: str) -> List[Dict[str, Any]]:
         """Download and parse the bulk operation result (JSONL)."""
         results: List[Dict[str, Any]] = []
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, timeout=None)
-            r.raise_for_status()
-            # NDJSON: each line is a JSON object
-            import json as _json
-            for line in r.text.splitlines():
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    obj = _json.loads(line)
-                except Exception:
-                    continue
-                if isinstance(obj, dict):
-                    results.append(obj)
+        async with self._client_session() as client:
+            # Stream the file and parse line by line so the raw body is never held in memory as a whole
+            async with client.stream('GET', url, timeout=None) as r:
+                r.raise_for_status()
+                # NDJSON: each line is a JSON object
+                async for line in r.aiter_lines():
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        obj = orjson.loads(line)
+                    except Exception:
+                        continue
+                    if isinstance(obj, dict):
+                        results.append(obj)
         return results
 
     async def fetch_all_product_handles_bulk(self, poll_interval_seconds: float = 2.0, timeout_seconds: float = 300.0) -> List[Dict[str, Any]]:
@@ -1208,17 +1340,17 @@ class ShopifyService:
         return product_nodes
 
    
-    async def _send_single_product(self, client: httpx.AsyncClient, product: ShopifyProductWrapper ) -> Dict[str, Any]:
+    async def _send_single_product(self, client: httpx.AsyncClient, product: ShopifyProductWrapper) -> Dict[str, Any]:
         try:
-            response = await client.post(
-                f"{self.shop_url}/admin/api/{self.api_version}/products.json",
-                headers=self.headers,
-                json={"product": product.product.model_dump()},
-                timeout=30.0
+            # Serialized once, straight to JSON bytes; retries resend the same body. The body carries the
+            # base64 images, so it is dumped in a worker thread while other products' requests are in flight
+            body = await asyncio.to_thread(SHOPIFY_PRODUCT_BODY_ADAPTER.dump_json, product)
+            response = await self._send_with_retry(
+                client, 'POST', f"{self.shop_url}/admin/api/{self.api_version}/products.json", body
             )
 
             if response.status_code == 201:
-                response_data = response.json()
+                response_data = orjson.loads(response.content)
                 return {
                     'status': 'success',
                     'product_id': product.product.handle,
@@ -1229,7 +1361,7 @@ class ShopifyService:
                 return {
                     'status': 'error',
                     'product_id': product.product.handle,
-                    'error': response.text,
+                    'error': self._error_text(response),
                     'status_code': response.status_code,
                 }
         except Exception as e:
@@ -12,6 +12,15 @@ import html as _html
 
 logger = logging.getLogger(__name__)
 
+# ProductId suffixes marking rental variants (C12/C24/C36 months) of a main product
+_RENTAL_SUFFIXES = frozenset({'C12', 'C24', 'C36'})
+
+# Fields a rental product (C12/C24/C36) inherits from its main product, with the default used when missing
+_RENTAL_INHERITED_FIELDS = (
+    ('LongDescription', ''), ('ImagePrimary', ''), ('ImageAdditional', ''), ('AccessoryProducts', ''),
+    ('Bildschirmdiagonale', None), ('Prozessor', None), ('GPU', None),
+    ('RAM', None), ('Speicher', None), ('Prozessorfamilie', None),
+)
 
 class WortmannService:
     def __init__(self, db_service: DatabaseService | None = None):
@@ -36,10 +45,7 @@ class WortmannService:
     def _parse_csv(self, content: bytes) -> List[Dict[str, Any]]:
         text = content.decode('utf-8', errors='ignore')
         reader = csv.DictReader(io.StringIO(text), delimiter=';')
-        rows: List[Dict[str, Any]] = []
-        for row in reader:
-            rows.append(row)
-        return rows
+        return list(reader)
 
     def _filter_categories(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         allowed = set([
@@ -460,6 +466,7 @@ class WortmannService:
         """
         Enrich rental products (C12/C24/C36) with data from their main products.
         This happens before database insertion for better performance.
+        Rental rows are updated in place and the same list is returned.
         """
         try:
             # Create lookup maps for main products
@@ -469,58 +476,36 @@ class WortmannService:
             # First pass: separate main products and rental products
             for product in products:
                 product_id = product.get('ProductId', '')
-                if product_id.endswith('C12') or product_id.endswith('C24') or product_id.endswith('C36'):
+                if product_id[-3:] in _RENTAL_SUFFIXES:
                     rental_products.append(product)
                 else:
                     main_products_by_id[product_id] = product
             
             logger.info(f"Found {len(main_products_by_id)} main products and {len(rental_products)} rental products")
             
-            # Second pass: enrich rental products with main product data
-            enriched_products = []
+            # Second pass: enrich rental products in place; main products are passed through untouched
             enriched_count = 0
-            main_products_count = 0
-            
-            for product in products:
+            for product in rental_products:
                 product_id = product.get('ProductId', '')
+                main_product_id = product_id[:-3]
+                main_product = main_products_by_id.get(main_product_id)
                 
-                # Check if this is a rental product that needs enrichment
-                if (product_id.endswith('C12') or product_id.endswith('C24') or product_id.endswith('C36')):
-                    main_product_id = product_id[:-3]
-                    main_product = main_products_by_id.get(main_product_id)
+                if main_product:
+                    product.update(
+                        (field, main_product.get(field, default)) for field, default in _RENTAL_INHERITED_FIELDS
+                    )
+                    product['_enriched'] = True
+                    enriched_count += 1
                     
-                    if main_product:
-                        # Create enriched copy of the rental product
-                        enriched_product = product.copy()
-                        enriched_product['LongDescription'] = main_product.get('LongDescription', '')
-                        enriched_product['ImagePrimary'] = main_product.get('ImagePrimary', '')
-                        enriched_product['ImageAdditional'] = main_product.get('ImageAdditional', '')
-                        enriched_product['AccessoryProducts'] = main_product.get('AccessoryProducts', '')
-                        # Also copy the extracted metafields from main product
-                        enriched_product['Bildschirmdiagonale'] = main_product.get('Bildschirmdiagonale')
-                        enriched_product['Prozessor'] = main_product.get('Prozessor')
-                        enriched_product['GPU'] = main_product.get('GPU')
-                        enriched_product['RAM'] = main_product.get('RAM')
-                        enriched_product['Speicher'] = main_product.get('Speicher')
-                        enriched_product['Prozessorfamilie'] = main_product.get('Prozessorfamilie')
-                        enriched_product['_enriched'] = True
-                        
-                        enriched_products.append(enriched_product)
-                        enriched_count += 1
-                        
-                        logger.info(f"Enriched rental product {product_id} with data from main product {main_product_id}")
-                    else:
-                        # Keep original if no main product found
-                        enriched_products.append(product)
-                        logger.warning(f"Main product {main_product_id} not found for rental product {product_id}")
+                    logger.debug("Enriched rental product %s with data from main product %s", product_id, main_product_id)
                 else:
-                    # Keep main products as-is
-                    enriched_products.append(product)
-                    main_products_count += 1
+                    # Keep original if no main product found
+                    logger.warning(f"Main product {main_product_id} not found for rental product {product_id}")
             
+            main_products_count = len(products) - len(rental_products)
             logger.info(f"Enriched {enriched_count} rental products and kept {main_products_count} main products during FTP processing")
-            logger.info(f"Total products to be inserted: {len(enriched_products)} (input: {len(products)})")
-            return enriched_products
+            logger.info(f"Total products to be inserted: {len(products)} (including {len(rental_products)} rental products)")
+            return products
             
         except Exception as e:
             logger.error(f"Error enriching rental products: {str(e)}")
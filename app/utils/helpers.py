@@ -7,6 +7,10 @@ def to_base64(input_data: Any) -> str:
     if not input_data:
         return ''
     
+    # Raw image bytes (VARBINARY column) are encoded once, here at the Shopify boundary
+    if isinstance(input_data, (bytes, bytearray, memoryview)):
+        return base64.b64encode(input_data).decode('ascii')
+    
     if isinstance(input_data, str):
         if input_data.startswith('0x'):
             input_data = input_data[2:]
@@ -15,9 +19,6 @@ def to_base64(input_data: Any) -> str:
         except ValueError:
             return base64.b64encode(input_data.encode('utf-8')).decode('utf-8')
     
-    if isinstance(input_data, bytes):
-        return base64.b64encode(input_data).decode('utf-8')
-    
     if isinstance(input_data, list):
         return base64.b64encode(bytes(input_data)).decode('utf-8')
     
@@ -24,6 +24,9 @@ class _FakeDB:
     def fetch_images(self, limit=None):
         return [{"supplier_aid": "123", "base64": "aGVsbG8=", "IsPrimary": 1}]
 
+    def iter_images(self, limit=None):
+        return iter(self.fetch_images(limit))
+
     def fetch_warranties(self):
         return [{"id": 1, "name": "Std", "monate": 12, "prozentsatz": 0, "garantiegruppe": 0}]
 
@@ -36,6 +39,12 @@ class _FakeDB:
     def fetch_warranties_by_groups(self, groups):
         return []
 
+    def fetch_images_by_supplier_aids_indexed(self, aids):
+        return {}
+
+    def fetch_warranties_by_groups_indexed(self, groups):
+        return {}
+
 
 class _FakeShopify:
     async def test_connection(self) -> bool:
@@ -53,6 +62,9 @@ class _FakeShopify:
     async def get_product_by_handle(self, handle: str):
         return {"id": 111, "handle": handle}
 
+    async def get_products_by_handles(self, handles):
+        return {h: {"id": 111, "handle": h} for h in handles}
+
     async def update_product_by_handle(self, handle: str, data: dict):
         return {"status": "success", "handle": handle}
 
@@ -0,0 +1,134 @@
+from contextlib import contextmanager
+
+import pytest
+
+from app.services import database_service as dbs
+
+
+class _FakeCursor:
+    """Answers every SELECT with one row per bound parameter"""
+
+    def __init__(self):
+        self.description = (('ProductId', None), ('Title', None))
+        self.statements = []
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, list(params)))
+        self._rows = [(p, f"T{p}") for p in params]
+        return self
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_rows_to_dicts_zips_columns():
+    cursor = _FakeCursor().execute("SELECT * FROM WortmannProdukte", ["1", "2"])
+    assert dbs._rows_to_dicts(cursor) == [
+        {'ProductId': '1', 'Title': 'T1'},
+        {'ProductId': '2', 'Title': 'T2'},
+    ]
+
+
+def test_fetch_where_in_splits_large_id_lists():
+    cursor = _FakeCursor()
+    ids = [str(i) for i in range(dbs.IN_CLAUSE_CHUNK_SIZE + 5)]
+
+    rows = dbs._fetch_where_in(cursor, "SELECT * FROM WortmannProdukte", "ProductId", ids)
+
+    assert [r['ProductId'] for r in rows] == ids
+    assert [len(params) for _, params in cursor.statements] == [dbs.IN_CLAUSE_CHUNK_SIZE, 5]
+
+
+class _FakeWarrantyManager:
+    """Pooled-connection stand-in whose GarantieOptionen rows can change between calls"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    @contextmanager
+    def get_connection(self):
+        yield self
+
+    def cursor(self):
+        manager = self
+
+        class _Cursor:
+            description = tuple((c, None) for c in ('id', 'name', 'monate', 'prozentsatz', 'minimum', 'garantiegruppe'))
+
+            def execute(self, sql, params=()):
+                manager.queries += 1
+                self._rows = [r for r in manager.rows if r[5] in params]
+                return self
+
+            def fetchall(self):
+                return self._rows
+
+        return _Cursor()
+
+
+def test_fetch_warranties_by_groups_sees_changed_rows():
+    manager = _FakeWarrantyManager([(1, '2 Jahre', 24, 5.0, 0, 3)])
+    svc = dbs.DatabaseService()
+    svc.db_manager = manager
+
+    assert svc.fetch_warranties_by_groups([3])[0]['prozentsatz'] == 5.0
+    manager.rows = [(1, '2 Jahre', 24, 7.5, 0, 3)]
+    assert svc.fetch_warranties_by_groups([3])[0]['prozentsatz'] == 7.5
+
+
+class _FakeBulkConnection:
+    """Records statements; optionally fails the Nth executemany batch"""
+
+    def __init__(self, fail_on_batch=None):
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail_on_batch = fail_on_batch
+        self.autocommit = True
+
+    def cursor(self):
+        conn = self
+
+        class _Cursor:
+            fast_executemany = False
+
+            def execute(self, sql, params=()):
+                conn.statements.append(sql)
+
+            def executemany(self, sql, rows):
+                conn.statements.append(sql)
+                if conn.fail_on_batch is not None and conn.statements.count(sql) == conn.fail_on_batch:
+                    raise RuntimeError("insert failed")
+
+        return _Cursor()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_upsert_stages_only_loaded_columns_and_merges_after_full_load():
+    conn = _FakeBulkConnection()
+    svc = dbs.DatabaseService(connection=conn)
+
+    assert svc.upsert_wortmann_products([{'ProductId': '1'}, {'ProductId': '2'}], batch_size=1) == 2
+
+    assert "SELECT TOP 0 *" not in " ".join(conn.statements)
+    assert dbs._CREATE_WORTMANN_STAGING_SQL[1] in conn.statements
+    assert conn.statements[-2] == dbs._MERGE_WORTMANN_STAGING_SQL
+    assert dbs._MERGE_WORTMANN_STAGING_SQL.strip().startswith("IF EXISTS (SELECT 1 FROM #WortmannStaging)")
+
+
+def test_upsert_never_merges_a_partial_staging_load():
+    conn = _FakeBulkConnection(fail_on_batch=2)
+    svc = dbs.DatabaseService(connection=conn)
+
+    with pytest.raises(RuntimeError):
+        svc.upsert_wortmann_products([{'ProductId': '1'}, {'ProductId': '2'}], batch_size=1, commit_size=1)
+
+    assert dbs._MERGE_WORTMANN_STAGING_SQL not in conn.statements
+    assert conn.rollbacks == 1
@@ -1,4 +1,4 @@
-from app.services.product_service import ProductService
+from app.services.product_service import ProductService, _image_to_base64
 
 
 def test_merge_and_process_simple():
@@ -15,7 +15,7 @@ def test_merge_and_process_simple():
     images = [{"supplier_aid": "123", "base64": "aGVsbG8=", "IsPrimary": 1}]
     warranties = []
 
-    merged = svc.merge_data(products, images, warranties)
+    merged = list(svc.merge_data(products, images, warranties))
     assert merged and len(merged) >= 1
 
     wrappers = svc.process_products(merged)
@@ -24,3 +24,39 @@ def test_merge_and_process_simple():
     assert p.variants and len(p.variants) == 1
 
 
+def test_merge_data_attaches_images_and_warranties_per_product():
+    svc = ProductService()
+    products = [{"ProductId": "1", "Title": "T", "Price_B2C_inclVAT": 100.0, "Stock": 1, "Garantiegruppe": 2}]
+    images = [
+        {"supplier_aid": "1", "base64": b"second", "IsPrimary": 0},
+        {"supplier_aid": "1", "base64": b"first", "IsPrimary": 1},
+        {"supplier_aid": "1", "base64": b"second", "IsPrimary": 1},
+    ]
+    warranties = [
+        {"id": 7, "name": "Plus", "monate": 24, "prozentsatz": 10, "minimum": 0, "garantiegruppe": 2},
+        {"id": 8, "name": "Max", "monate": 36, "prozentsatz": 20, "minimum": 0, "garantiegruppe": 2},
+    ]
+
+    merged = list(svc.merge_data(products, images, warranties))
+    assert len(merged) == 1
+    product, merged_images, merged_warranties = merged[0]
+    assert product is products[0]
+    assert list(merged_images) == ["Zmlyc3Q=", "c2Vjb25k"]
+    assert [w["id"] for w in merged_warranties] == [7, 8]
+
+    p = svc.process_products(merged)[0].product
+    assert len(p.images) == 2
+    assert [v["price"] for v in p.variants] == ["110.00", "120.00"]
+
+
+def test_image_to_base64_encodes_raw_blobs_once():
+    blob = b"\x89PNG\r\n"
+
+    assert _image_to_base64({"base64": blob}) == "iVBORw0K"
+    assert _image_to_base64({"base64": bytearray(blob)}) == "iVBORw0K"
+    assert _image_to_base64({"base64": memoryview(blob)}) == "iVBORw0K"
+    assert _image_to_base64({"base64": None}) == ""
+
+
+def test_image_to_base64_falls_back_to_hex():
+    assert _image_to_base64({"base64": None, "hex": "0x4142"}) == "QUI="
@@ -1,3 +1,5 @@
+from app.api import deps
+from app.main import app
 from app.models.product import WorkflowRequest, SyncProductsRequest, DeleteProductsRequest
 
 
@@ -25,6 +27,41 @@ def test_delete_products_by_ids(client):
     assert data["status"] == "completed"
 
 
+def test_delete_products_by_ids_deletes_repeated_ids_once(client):
+    class _Shopify:
+        def __init__(self):
+            self.deleted = []
+
+        async def get_products_by_handles(self, handles):
+            return {h: {"id": 111, "handle": h} for h in handles}
+
+        async def delete_product_by_id(self, sid: int):
+            self.deleted.append(sid)
+            return {"status": "success"}
+
+    shopify = _Shopify()
+    app.dependency_overrides[deps.get_shopify_service] = lambda: shopify
+    payload = DeleteProductsRequest(product_ids=["123", "prod-123", "456"]).model_dump()
+    r = client.post("/api/v1/products/delete-products-by-ids", json=payload)
+    assert r.status_code == 200
+    assert [res["product_id"] for res in r.json()["results"]] == ["123", "456"]
+    assert len(shopify.deleted) == 2
+
+
+def test_delete_products_by_ids_reports_failed_lookups_as_errors(client):
+    class _Shopify:
+        async def get_products_by_handles(self, handles):
+            raise RuntimeError("GraphQL 502")
+
+    app.dependency_overrides[deps.get_shopify_service] = lambda: _Shopify()
+    payload = DeleteProductsRequest(product_ids=["123"]).model_dump()
+    r = client.post("/api/v1/products/delete-products-by-ids", json=payload)
+    assert r.status_code == 200
+    result = r.json()["results"][0]
+    assert result["status"] == "error"
+    assert "GraphQL 502" in result["message"]
+
+
 def test_create_products_by_ids(client):
     payload = SyncProductsRequest(product_ids=["123"], batch_size=2).model_dump()
     r = client.post("/api/v1/products/create-products-by-ids", json=payload)
@@ -41,3 +78,27 @@ def test_update_products_by_ids(client):
     assert data["status"] == "completed"
 
 
+def test_update_products_by_ids_reads_each_warranty_group_once(client):
+    class _DB:
+        def __init__(self):
+            self.warranty_lookups = []
+
+        def fetch_products_by_ids(self, ids):
+            return [{"ProductId": pid, "Title": "T", "Price_B2C_inclVAT": 10.0, "Stock": 5, "GrossWeight": 1.2,
+                     "Garantiegruppe": 3} for pid in ids]
+
+        def fetch_images_by_supplier_aids_indexed(self, aids):
+            return {}
+
+        def fetch_warranties_by_groups_indexed(self, groups):
+            self.warranty_lookups.append(sorted(groups))
+            return {3: [{"id": 1, "name": "2 Jahre", "monate": 24, "prozentsatz": 5, "garantiegruppe": 3}]}
+
+    db = _DB()
+    app.dependency_overrides[deps.get_database_service] = lambda: db
+    payload = SyncProductsRequest(product_ids=[str(i) for i in range(250)], batch_size=2).model_dump()
+    r = client.post("/api/v1/products/update-products-by-ids", json=payload)
+    assert r.status_code == 200
+    assert r.json()["total_products"] == 250
+    assert db.warranty_lookups == [[3]]
+
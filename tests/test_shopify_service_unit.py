@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 import anyio
 
@@ -11,15 +13,11 @@ async def test_test_connection_ok(monkeypatch):
         text = "{}"
 
     class _Client:
-        async def __aenter__(self):
-            return self
-        async def __aexit__(self, exc_type, exc, tb):
-            return False
         async def get(self, *args, **kwargs):
             return _Resp()
 
     import httpx
-    monkeypatch.setattr(httpx, "AsyncClient", lambda: _Client())
+    monkeypatch.setattr(httpx, "AsyncClient", lambda **kwargs: _Client())
 
     svc = ShopifyService()
     ok = await svc.test_connection()
@@ -33,3 +31,196 @@ async def test_send_products_batch_empty():
     assert res == []
 
 
+async def test_send_products_batch_keeps_input_order(monkeypatch):
+    from app.models.shopify import ShopifyProduct, ShopifyProductWrapper
+
+    svc = ShopifyService()
+
+    async def _send(client, product):
+        # Later products finish first; results must still follow the input order
+        await asyncio.sleep(0.01 * (6 - int(product.product.handle.split("-")[1])))
+        return {"status": "success", "product_id": product.product.handle}
+
+    monkeypatch.setattr(svc, "_send_single_product", _send)
+    products = [
+        ShopifyProductWrapper(product=ShopifyProduct(title=f"T{i}", handle=f"prod-{i}", body_html="", variants=[], options=[], metafields=[]))
+        for i in range(6)
+    ]
+
+    res = await svc.send_products_batch(products, batch_size=50)
+
+    assert [r["product_id"] for r in res] == [f"prod-{i}" for i in range(6)]
+
+
+async def test_send_with_retry_waits_out_429(monkeypatch):
+    class _Resp:
+        def __init__(self, status_code, headers):
+            self.status_code = status_code
+            self.headers = headers
+
+    responses = [
+        _Resp(429, {"Retry-After": "2.0"}),
+        _Resp(201, {"X-Shopify-Shop-Api-Call-Limit": "10/40"}),
+    ]
+
+    class _Client:
+        async def request(self, method, url, **kwargs):
+            return responses.pop(0)
+
+    waits = []
+
+    async def _sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", _sleep)
+
+    svc = ShopifyService()
+    resp = await svc._send_with_retry(_Client(), "POST", "https://shop/products.json", b"{}")
+
+    assert resp.status_code == 201
+    assert waits == [2.0]
+    assert svc._rest_bucket_fill == 0.25
+
+
+def test_error_text_truncates_large_bodies():
+    import httpx
+
+    resp = httpx.Response(500, content=b"x" * 5000)
+
+    assert ShopifyService._error_text(resp) == "x" * 1024
+    assert ShopifyService._error_text(httpx.Response(422, content=b'{"errors":"bad"}')) == '{"errors":"bad"}'
+
+
+def test_graphql_throttle_delay_waits_only_for_missing_points():
+    def _cost(available):
+        return {"extensions": {"cost": {
+            "requestedQueryCost": 502,
+            "throttleStatus": {"currentlyAvailable": available, "restoreRate": 50.0},
+        }}}
+
+    assert ShopifyService._graphql_throttle_delay(_cost(1000)) == 0.0
+    assert ShopifyService._graphql_throttle_delay(_cost(402)) == 2.0
+    assert ShopifyService._graphql_throttle_delay({}) == 0.0
+
+
+async def test_get_products_by_handles_batches_aliased_lookups(monkeypatch):
+    import orjson
+
+    class _Resp:
+        status_code = 200
+
+        def __init__(self, content):
+            self.content = content
+
+    svc = ShopifyService()
+    sent = []
+
+    async def _graphql(client, query, variables=None):
+        sent.append(variables)
+        data = {f"p{i}": ({"id": f"gid://shopify/Product/{i}", "handle": h} if h != "prod-missing" else None)
+                for i, h in enumerate(variables.values())}
+        return _Resp(orjson.dumps({"data": data}))
+
+    monkeypatch.setattr(svc, "_graphql", _graphql)
+    monkeypatch.setattr(svc, "_get_client", lambda: object())
+
+    found = await svc.get_products_by_handles(["prod-1", "prod-2", "prod-missing", "prod-1"], chunk_size=2)
+
+    assert [list(v.values()) for v in sent] == [["prod-1", "prod-2"], ["prod-missing"]]
+    assert found["prod-1"]["handle"] == "prod-1"
+    assert found["prod-2"]["id"] == 1
+    assert found["prod-missing"] is None
+
+
+async def test_get_products_by_handles_raises_on_failed_lookup(monkeypatch):
+    class _Resp:
+        status_code = 502
+        content = b"bad gateway"
+
+    async def _graphql(client, query, variables=None):
+        return _Resp()
+
+    svc = ShopifyService()
+    monkeypatch.setattr(svc, "_graphql", _graphql)
+    monkeypatch.setattr(svc, "_get_client", lambda: object())
+
+    with pytest.raises(RuntimeError):
+        await svc.get_products_by_handles(["prod-1"])
+    assert await svc.get_product_by_handle("prod-1") is None
+
+
+async def test_fetch_all_products_requests_next_page_before_mapping(monkeypatch):
+    import orjson
+    import app.services.shopify_service as shopify_module
+
+    events = []
+    pages = {
+        None: {"edges": [{"node": {"id": "gid://shopify/Product/1", "handle": "prod-1"}}],
+               "pageInfo": {"hasNextPage": True, "endCursor": "c1"}},
+        "c1": {"edges": [{"node": {"id": "gid://shopify/Product/2", "handle": "prod-2"}}],
+               "pageInfo": {"hasNextPage": False, "endCursor": None}},
+    }
+
+    class _Resp:
+        status_code = 200
+
+        def __init__(self, content):
+            self.content = content
+
+    async def _graphql(client, query, variables=None):
+        events.append(f"request {variables['after']}")
+        return _Resp(orjson.dumps({"data": {"products": pages[variables["after"]]}}))
+
+    def _gid(gid):
+        events.append(f"map {gid}")
+        return int(gid.rsplit("/", 1)[1])
+
+    svc = ShopifyService()
+    monkeypatch.setattr(svc, "_graphql", _graphql)
+    monkeypatch.setattr(svc, "_get_client", lambda: object())
+    monkeypatch.setattr(shopify_module, "gid_to_numeric_id", _gid)
+
+    products = await svc.fetch_all_products()
+
+    assert [p["handle"] for p in products] == ["prod-1", "prod-2"]
+    assert events.index("request c1") < events.index("map gid://shopify/Product/1")
+
+
+async def test_send_products_batch_serializes_bodies_as_they_are_sent(monkeypatch):
+    import app.services.shopify_service as shopify_module
+    from app.models.shopify import ShopifyProduct, ShopifyProductWrapper
+
+    events = []
+
+    class _Adapter:
+        @staticmethod
+        def dump_json(product):
+            events.append(f"dump {product.product.handle}")
+            return b"{}"
+
+    class _Resp:
+        status_code = 201
+        content = b'{"product": {"id": 1}}'
+
+    async def _send_with_retry(client, method, url, body):
+        events.append("send")
+        return _Resp()
+
+    async def _no_pacing(seconds):
+        pass
+
+    svc = ShopifyService()
+    monkeypatch.setattr(asyncio, "sleep", _no_pacing)
+    monkeypatch.setattr(shopify_module, "SHOPIFY_PRODUCT_BODY_ADAPTER", _Adapter)
+    monkeypatch.setattr(svc, "_send_with_retry", _send_with_retry)
+    monkeypatch.setattr(svc, "_get_client", lambda: object())
+    products = [
+        ShopifyProductWrapper(product=ShopifyProduct(title=f"T{i}", handle=f"prod-{i}", body_html="", variants=[], options=[], metafields=[]))
+        for i in range(3)
+    ]
+
+    res = await svc.send_products_batch(products, batch_size=1)
+
+    assert [r["status"] for r in res] == ["success"] * 3
+    assert events == ["dump prod-0", "send", "dump prod-1", "send", "dump prod-2", "send"]
+